@@ -0,0 +1,386 @@
+"""Time builds of the site against a synthetic corpus of posts.
+
+The corpus is written to a temporary directory next to copies of the real
+templates, CSS and JS, and build.py is run there in a fresh interpreter so
+the timings include everything a real ``uv run build.py`` pays for. Posts
+vary in length and are made of prose, tables, code fences taken from the
+real posts in ``src/posts/``, math blocks and images, in proportions set on
+the command line.
+
+Every run times these scenarios:
+
+- ``cold``: no ``build/`` and no ``.cache/``.
+- ``warm``: a full build with the caches left by the previous one.
+- ``incremental``: ``--incremental`` with nothing changed.
+- ``incremental-post``: ``--incremental`` after editing one post.
+- ``serve-post``, ``serve-css``, ``serve-static``: the rebuild ``--serve``
+  runs after editing a post, the stylesheet or a plain static file.
+
+With ``--results``, the timings and peak memory are appended to a JSON lines
+file, and compared with the last entry there for the same corpus.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+
+WORDS = (
+    "binary patch decompile offset register stack heap pointer license check "
+    "ransomware key stream cipher token player track python object frame "
+    "bytecode reference cache interpreter"
+).split()
+
+CODE_SAMPLES = [
+    (
+        "c",
+        "int __fastcall main(int argc, char **argv)\n{\n"
+        "  if ( argc == 2 )\n    encrypt_dir(argv[1]);\n  return 0;\n}",
+    ),
+    (
+        "python",
+        "import ctypes\n\ndef deref(addr):\n"
+        "    return ctypes.cast(addr, ctypes.py_object).value\n",
+    ),
+    (
+        "",
+        "mov rax, qword ptr [rbp - 0x18]\ncall sub_401000\ntest eax, eax\njne 0x401234",
+    ),
+]
+
+MATH_SAMPLES = [
+    r"\ket{\psi} = \alpha \ket{0} + \beta \ket{1}",
+    r"\braket{\phi | \psi} = \sum_{i} \overline{\phi_i} \psi_i",
+    r"k_{i+1} = (k_i \oplus \mathrm{rotl}(k_i, 13)) \bmod 2^{32}",
+    r"H(X) = -\sum_{x} p(x) \log_2 p(x)",
+    r"\frac{\partial L}{\partial w} = \frac{1}{n} \sum_{i=1}^{n} (y_i - \hat{y}_i) x_i",
+]
+
+FENCE = re.compile(r"^```(\w*)\n(.*?)^```", re.M | re.S)
+
+SCENARIOS = [
+    "cold",
+    "warm",
+    "incremental",
+    "incremental-post",
+    "serve-post",
+    "serve-css",
+    "serve-static",
+]
+
+# Runs the serve rebuild path in process: an initial build, then the same
+# RebuildHandler that --serve uses, handed one changed path at a time.
+SERVE_RUNNER = r"""
+import json, os, sys, time
+root, results = sys.argv[1:3]
+edits = json.loads(sys.argv[3])
+sys.path.insert(0, root)
+from functools import partial
+from build import build
+from webcore.serve import RebuildHandler
+
+# The options --serve forces, so stylesheet edits take the same path.
+serve = partial(build, incremental=True, fingerprint=False, critical_css=False)
+serve()
+handler = RebuildHandler(serve)
+timings = {}
+for label, path, text in edits:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+    start = time.perf_counter()
+    handler.pending.add(os.path.abspath(path))
+    handler.flush()
+    timings[label] = time.perf_counter() - start
+with open(results, "w", encoding="utf-8") as f:
+    json.dump(timings, f)
+"""
+
+
+def real_code_samples():
+    """Code fences from the real posts, so highlighting sees realistic input."""
+    samples = []
+    for path in sorted((ROOT / "src" / "posts").glob("*.md")):
+        for lang, code in FENCE.findall(path.read_text(encoding="utf-8")):
+            samples.append((lang, code.rstrip("\n")))
+    return samples or CODE_SAMPLES
+
+
+def sentence(rng: random.Random, words: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def around(rng: random.Random, mean: float) -> int:
+    """A count that averages ``mean`` but varies from post to post."""
+    if mean <= 0:
+        return 0
+    return rng.randint(0, round(2 * mean))
+
+
+def make_png(rng: random.Random, width: int, height: int) -> bytes:
+    """A gradient PNG, different for every call, without needing Pillow."""
+
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    r, g, b = (rng.randint(0, 255) for _ in range(3))
+    rows = bytearray()
+    for y in range(height):
+        shade = y * 255 // max(1, height - 1)
+        rows.append(0)
+        rows += bytes([(r + shade) % 256, g, b]) * width
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(bytes(rows), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def make_post(rng: random.Random, index: int, args, code_samples, tags) -> str:
+    post_tags = rng.sample(tags, min(args.tags_per_post, len(tags)))
+    lines = [
+        "---",
+        f'title: "Synthetic post {index}"',
+        f'date: "2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"',
+        f'excerpt: "{sentence(rng)}"',
+        f"tags: {post_tags!r}".replace("'", '"'),
+        "---",
+        "",
+    ]
+    sections = max(1, around(rng, args.sections))
+    for section in range(sections):
+        lines.append(f"## Section {section}")
+        lines.append("")
+        lines.append(" ".join(sentence(rng) for _ in range(5)))
+        lines.append("")
+        for _ in range(around(rng, args.code_blocks)):
+            lang, code = rng.choice(code_samples)
+            lines.append(f"```{lang}")
+            lines.append(code)
+            lines.append("```")
+            lines.append("")
+        for _ in range(around(rng, args.math / sections)):
+            lines.append(f"Where ${rng.choice(MATH_SAMPLES)}$ holds, so")
+            lines.append("")
+            lines.append("$$")
+            lines.append(rng.choice(MATH_SAMPLES))
+            lines.append("$$")
+            lines.append("")
+        lines.append("| Offset | Value |")
+        lines.append("| ------ | ----- |")
+        lines.append(f"| 0x{rng.randint(0, 0xFFFF):04x} | {rng.choice(WORDS)} |")
+        lines.append("")
+    for image in range(around(rng, args.images)):
+        lines.append(f"![figure {image}](/static/posts/bench/post-{index:05d}-{image}.png)")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def make_corpus(dest: Path, args) -> None:
+    rng = random.Random(args.seed)
+    src = dest / "src"
+    (src / "posts").mkdir(parents=True)
+    (src / "static" / "posts" / "bench").mkdir(parents=True)
+    for template in (ROOT / "src").glob("*.html"):
+        shutil.copy2(template, src / template.name)
+    shutil.copytree(ROOT / "src" / "static" / "css", src / "static" / "css")
+    shutil.copytree(ROOT / "src" / "static" / "js", src / "static" / "js")
+    shutil.copy2(ROOT / "CNAME", dest / "CNAME")
+    (src / "static" / "posts" / "bench" / "notes.txt").write_text(
+        sentence(rng) + "\n", encoding="utf-8"
+    )
+
+    code_samples = real_code_samples()
+    tags = [f"tag-{n}" for n in range(args.tags)]
+    for i in range(args.posts):
+        post = make_post(rng, i, args, code_samples, tags)
+        (src / "posts" / f"post-{i:05d}.md").write_text(post, encoding="utf-8")
+        for image in range(post.count(f"post-{i:05d}-")):
+            width = rng.choice([640, 1200, 2000])
+            (src / "static" / "posts" / "bench" / f"post-{i:05d}-{image}.png").write_bytes(
+                make_png(rng, width, width * 9 // 16)
+            )
+
+
+def max_rss(rusage) -> int:
+    """Peak resident memory in bytes; Linux reports KiB, macOS bytes."""
+    return rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+
+
+def run(command, workdir: Path):
+    """Run ``command`` in ``workdir`` and return its wall time and peak memory."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        command, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    if hasattr(os, "wait4"):
+        _, status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        peak = max_rss(rusage)
+    else:
+        proc.wait()
+        peak = None
+    seconds = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, command)
+    return seconds, peak
+
+
+def time_build(workdir: Path, extra_args):
+    return run([sys.executable, str(ROOT / "build.py"), *extra_args], workdir)
+
+
+def time_serve(workdir: Path):
+    """Time the --serve rebuild of a post, the stylesheet and a static file."""
+    src = workdir / "src"
+    edits = [
+        ["serve-post", str(src / "posts" / "post-00000.md"), "\nOne more line.\n"],
+        ["serve-css", str(src / "static" / "css" / "style.css"), "\n/* edit */\n"],
+        ["serve-static", str(src / "static" / "posts" / "bench" / "notes.txt"), "edit\n"],
+    ]
+    results = workdir / "serve.json"
+    _, peak = run(
+        [sys.executable, "-c", SERVE_RUNNER, str(ROOT), str(results), json.dumps(edits)],
+        workdir,
+    )
+    timings = json.loads(results.read_text(encoding="utf-8"))
+    return {label: (seconds, peak) for label, seconds in timings.items()}
+
+
+def run_once(workdir: Path, build_args):
+    shutil.rmtree(workdir / "build", ignore_errors=True)
+    shutil.rmtree(workdir / ".cache", ignore_errors=True)
+    results = {"cold": time_build(workdir, build_args)}
+    results["warm"] = time_build(workdir, build_args)
+    results["incremental"] = time_build(workdir, ["--incremental", *build_args])
+    with open(workdir / "src" / "posts" / "post-00001.md", "a", encoding="utf-8") as f:
+        f.write("\nOne more line.\n")
+    results["incremental-post"] = time_build(workdir, ["--incremental", *build_args])
+    results.update(time_serve(workdir))
+    return results
+
+
+def summarize(runs):
+    summary = {}
+    for scenario in SCENARIOS:
+        times = [r[scenario][0] for r in runs]
+        peaks = [r[scenario][1] for r in runs if r[scenario][1] is not None]
+        summary[scenario] = {
+            "times": times,
+            "min": min(times),
+            "median": statistics.median(times),
+            "max": max(times),
+            "peak_rss": max(peaks) if peaks else None,
+        }
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_result(path: Path, corpus):
+    """The last entry in the results file that was run on the same corpus."""
+    if not path.exists():
+        return None
+    previous = None
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            entry = json.loads(line)
+            if entry.get("corpus") == corpus:
+                previous = entry
+    return previous
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="webcore build benchmark")
+    parser.add_argument("--posts", type=int, default=300, help="Number of synthetic posts")
+    parser.add_argument("--sections", type=float, default=6, help="Mean sections per post")
+    parser.add_argument(
+        "--code-blocks", type=float, default=2, help="Mean code fences per section"
+    )
+    parser.add_argument("--math", type=float, default=0, help="Mean math blocks per post")
+    parser.add_argument("--images", type=float, default=0, help="Mean images per post")
+    parser.add_argument("--tags", type=int, default=7, help="Number of distinct tags")
+    parser.add_argument("--tags-per-post", type=int, default=3, help="Tags on each post")
+    parser.add_argument("--runs", type=int, default=3, help="Number of timed runs")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the corpus generator")
+    parser.add_argument(
+        "--results",
+        type=Path,
+        metavar="PATH",
+        help="Append the results to this JSON lines file and compare with the last run",
+    )
+    # Anything else is passed to build.py; the serve rebuilds use --serve's options.
+    args, build_args = parser.parse_known_args()
+
+    corpus = {
+        name: getattr(args, name)
+        for name in (
+            "posts", "sections", "code_blocks", "math", "images", "tags", "tags_per_post", "seed"
+        )
+    }
+    with tempfile.TemporaryDirectory(prefix="webcore-bench-") as tmp:
+        workdir = Path(tmp)
+        make_corpus(workdir, args)
+        runs = [run_once(workdir, build_args) for _ in range(args.runs)]
+    summary = summarize(runs)
+
+    previous = previous_result(args.results, corpus) if args.results else None
+    print(f"{args.posts} posts, {args.runs} runs")
+    print(f"  {'scenario':<17} {'min':>8} {'median':>8} {'max':>8} {'peak mem':>9}")
+    for scenario, result in summary.items():
+        peak = f"{result['peak_rss'] / 2**20:.0f} MiB" if result["peak_rss"] else "-"
+        line = (
+            f"  {scenario:<17} {result['min']:>7.3f}s {result['median']:>7.3f}s "
+            f"{result['max']:>7.3f}s {peak:>9}"
+        )
+        if previous is not None and scenario in previous["scenarios"]:
+            before = previous["scenarios"][scenario]["median"]
+            line += f"  {(result['median'] - before) / before:+.1%}"
+        print(line)
+    if previous is not None:
+        print(f"Compared with {previous.get('commit') or 'unknown'} ({previous['timestamp']})")
+
+    if args.results:
+        entry = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "corpus": corpus,
+            "build_args": build_args,
+            "scenarios": summary,
+        }
+        with open(args.results, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
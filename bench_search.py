@@ -0,0 +1,164 @@
+"""Measure the search index against a synthetic corpus of posts.
+
+Builds the index for thousands of generated posts (with a Zipf-distributed
+vocabulary, so shards are as lopsided as real text makes them), reports its
+size, and times queries through ``static/js/search.js`` under node, loading
+shards from disk the way the browser would fetch them.
+"""
+
+import argparse
+import gzip
+import json
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from webcore.posts import Post
+from webcore.search import build_index
+
+ROOT = Path(__file__).resolve().parent
+
+NODE_RUNNER = r"""
+const fs = require("fs");
+const { SearchIndex } = require(process.argv[1]);
+const [base, queriesPath] = process.argv.slice(2);
+const load = (url) => Promise.resolve(JSON.parse(fs.readFileSync(url, "utf8")));
+const queries = JSON.parse(fs.readFileSync(queriesPath, "utf8"));
+
+(async () => {
+    const cold = [], warm = [], hits = [];
+    const shared = new SearchIndex(base, load);
+    for (const q of queries) {
+        // Cold: a fresh page, so meta, docs and shards are all loaded.
+        let start = process.hrtime.bigint();
+        await new SearchIndex(base, load).search(q);
+        cold.push(Number(process.hrtime.bigint() - start) / 1e6);
+        await shared.search(q);
+        start = process.hrtime.bigint();
+        hits.push((await shared.search(q)).length);
+        warm.push(Number(process.hrtime.bigint() - start) / 1e6);
+    }
+    console.log(JSON.stringify({ cold, warm, hits }));
+})();
+"""
+
+
+def make_vocabulary(rng: random.Random, size: int):
+    syllables = "ka lo mi ne ru sa te vo xi bar cor dex fen gul hop jin kru".split()
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_posts(count: int, words_per_post: int, vocabulary: int, seed: int):
+    rng = random.Random(seed)
+    vocab = make_vocabulary(rng, vocabulary)
+    weights = [1 / (rank + 1) for rank in range(len(vocab))]
+    tags = vocab[:30]
+    posts = []
+    for i in range(count):
+        body = rng.choices(vocab, weights, k=words_per_post)
+        paragraphs = [" ".join(body[j : j + 60]) for j in range(0, len(body), 60)]
+        posts.append(
+            Post(
+                title=" ".join(rng.choices(vocab, weights, k=rng.randint(3, 8))),
+                date=date(2020, 1, 1) + timedelta(days=i),
+                excerpt=" ".join(rng.choices(vocab, weights, k=20)),
+                url=f"/posts/post-{i:05d}/",
+                content="".join(f"<p>{p}</p>\n" for p in paragraphs),
+                tags=rng.sample(tags, 3),
+            )
+        )
+    return posts, vocab, weights
+
+
+def make_queries(rng: random.Random, vocab, weights, count: int):
+    queries = []
+    for _ in range(count):
+        terms = rng.choices(vocab, weights, k=rng.randint(1, 3))
+        query = " ".join(terms)
+        queries.append(f'"{query}"' if rng.random() < 0.2 and len(terms) > 1 else query)
+    return queries
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="webcore search index benchmark")
+    parser.add_argument("--posts", type=int, default=5000, help="Number of synthetic posts")
+    parser.add_argument("--words", type=int, default=800, help="Body words per post")
+    parser.add_argument("--vocabulary", type=int, default=20000, help="Distinct words")
+    parser.add_argument("--queries", type=int, default=200, help="Number of timed queries")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the corpus generator")
+    args = parser.parse_args()
+
+    posts, vocab, weights = make_posts(args.posts, args.words, args.vocabulary, args.seed)
+
+    start = time.perf_counter()
+    files = build_index(posts)
+    seconds = time.perf_counter() - start
+
+    shards = {n: d for n, d in files.items() if n.startswith("shard-")}
+    shard_sizes = [len(d) for d in shards.values()]
+    total = sum(len(d) for d in files.values())
+    compressed = sum(len(gzip.compress(d)) for d in files.values())
+    meta = json.loads(files["meta.json"])
+
+    print(f"{args.posts} posts, {args.words} words each")
+    print(f"  index built in {seconds:.2f}s")
+    print(f"  total    {total / 1024:.0f} KiB ({compressed / 1024:.0f} KiB gzipped)")
+    print(f"  docs     {len(files[meta['docs']]) / 1024:.0f} KiB")
+    print(
+        f"  shards   {len(shards)}, mean {statistics.mean(shard_sizes) / 1024:.1f} KiB, "
+        f"max {max(shard_sizes) / 1024:.1f} KiB"
+    )
+
+    node = shutil.which("node")
+    if node is None:
+        print("node not found; skipping query timings")
+        return 0
+
+    queries = make_queries(random.Random(args.seed + 1), vocab, weights, args.queries)
+    with tempfile.TemporaryDirectory(prefix="webcore-search-") as tmp:
+        base = Path(tmp) / "search"
+        base.mkdir()
+        for name, data in files.items():
+            (base / name).write_bytes(data)
+        (Path(tmp) / "queries.json").write_text(json.dumps(queries), encoding="utf-8")
+        out = subprocess.run(
+            [
+                node,
+                "-e",
+                NODE_RUNNER,
+                str(ROOT / "src" / "static" / "js" / "search.js"),
+                f"{base}/",
+                str(Path(tmp) / "queries.json"),
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    timings = json.loads(out)
+
+    print(f"{len(queries)} queries ({statistics.mean(timings['hits']):.1f} results on average)")
+    for label in ("cold", "warm"):
+        values = timings[label]
+        print(
+            f"  {label:<5} p50 {percentile(values, 50):.2f}ms  "
+            f"p95 {percentile(values, 95):.2f}ms  max {max(values):.2f}ms"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
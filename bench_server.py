@@ -0,0 +1,133 @@
+"""Load-test the development server against the built site.
+
+Starts the server on ``build/`` in this process and has several keep-alive
+clients fetch every page and its stylesheets and images, then repeat the
+same requests with the validators from the first pass, the way a browser
+reloading a page would.
+"""
+
+import argparse
+import http.client
+import http.server
+import socketserver
+import statistics
+import sys
+import threading
+import time
+from functools import partial
+from pathlib import Path
+
+from webcore.serve import make_server
+
+
+def site_paths(root: Path):
+    paths = []
+    for path in sorted(root.rglob("*")):
+        if path.is_dir():
+            continue
+        rel = path.relative_to(root).as_posix()
+        if rel.endswith("index.html"):
+            rel = rel[: -len("index.html")]
+        paths.append("/" + rel)
+    return paths
+
+
+def client(port, paths, repeat, latencies, conditional, errors):
+    conn = http.client.HTTPConnection("localhost", port)
+    validators = {}
+    headers = {"Accept-Encoding": "gzip, br"}
+    for _ in range(repeat):
+        for path in paths:
+            request_headers = dict(headers)
+            if conditional and path in validators:
+                request_headers["If-None-Match"] = validators[path]
+            start = time.perf_counter()
+            try:
+                conn.request("GET", path, headers=request_headers)
+                response = conn.getresponse()
+                response.read()
+            except (http.client.HTTPException, OSError):
+                errors.append(path)
+                conn.close()
+                conn = http.client.HTTPConnection("localhost", port)
+                continue
+            latencies.append(time.perf_counter() - start)
+            if response.getheader("ETag"):
+                validators[path] = response.getheader("ETag")
+            if response.getheader("Connection", "").lower() == "close" or response.version == 10:
+                conn.close()
+                conn = http.client.HTTPConnection("localhost", port)
+    conn.close()
+
+
+def run(port, paths, clients, repeat, conditional):
+    latencies, errors = [], []
+    threads = [
+        threading.Thread(
+            target=client, args=(port, paths, repeat, latencies, conditional, errors)
+        )
+        for _ in range(clients)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="webcore dev server benchmark")
+    parser.add_argument("--dir", default="build", help="Built site to serve")
+    parser.add_argument("--port", type=int, default=3999)
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the site per client")
+    parser.add_argument("--compress", action="store_true", help="Enable on-the-fly compression")
+    parser.add_argument(
+        "--baseline",
+        action="store_true",
+        help="Benchmark the old single-threaded HTTP/1.0 TCPServer instead",
+    )
+    args = parser.parse_args()
+
+    root = Path(args.dir)
+    if not root.is_dir():
+        print(f"{root} doesn't exist, run build.py first")
+        return 1
+    paths = site_paths(root)
+
+    if args.baseline:
+        class QuietHandler(http.server.SimpleHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+        socketserver.TCPServer.allow_reuse_address = True
+        server = socketserver.TCPServer(
+            ("", args.port), partial(QuietHandler, directory=str(root))
+        )
+    else:
+        server = make_server(str(root), args.port, compress=args.compress, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        for label, conditional in (("cold", False), ("revalidate", True)):
+            latencies, errors, elapsed = run(
+                args.port, paths, args.clients, args.repeat, conditional
+            )
+            latencies.sort()
+            print(
+                f"{label:<10} {len(latencies)} requests in {elapsed:.2f}s "
+                f"({len(latencies) / elapsed:.0f} req/s), "
+                f"p50 {statistics.median(latencies) * 1000:.1f} ms, "
+                f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms, "
+                f"{len(errors)} errors"
+            )
+    finally:
+        server.shutdown()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
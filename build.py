@@ -1,244 +1,533 @@
-from staticjinja import Site  # type: ignore[import]
-from datetime import datetime, date
-from dataclasses import dataclass
-import frontmatter
-import markdown
+from datetime import datetime
+from dataclasses import dataclass, field
+from functools import partial
 import os
 from pathlib import Path
-from typing import List, Optional
 import shutil
 import argparse
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-import time
-import http.server
-import socketserver
-import threading
 import subprocess
+import time
+from typing import Iterable, List, Optional
+from webcore.cache import RenderCache
 
+# staticjinja, markdown, Pygments and watchdog are imported where they're
+# used, so importing this module (or running --about) stays cheap.
 
-@dataclass
-class Post:
-    title: str
-    date: date
-    excerpt: str
-    url: str
-    content: str
-    tags: List[str]
-
-
-markdowner = markdown.Markdown(
-    output_format="html",
-    extensions=[
-        'fenced_code', 
-        'codehilite', 
-        'mdx_math', 
-        'tables', 
-        'extra', 
-        'admonition', 
-        'toc',
-        'pymdownx.tilde',
-    ],
-    extension_configs={
-        'codehilite': {
-            'guess_lang': True,
-            'use_pygments': True,
-            'css_class': 'codehilite',
-        }
-    }
-)
 
-def md_context(template):
-    post = frontmatter.load(template.filename)
-    content_html = markdowner.convert(post.content)
+def md_context(template, post_index):
+    return {"post": post_index[f"/posts/{Path(template.name).stem}/"]}
 
-    return {
-        "post": Post(
-            title=post.metadata.get("title", "Untitled"),  # type: ignore
-            date=post.metadata.get("date", datetime.now().date()),  # type: ignore
-            excerpt=post.metadata.get("excerpt", ""),  # type: ignore
-            url=f"/posts/{Path(template.name).stem}",
-            content=content_html,
-            tags=post.metadata.get("tags", []),  # type: ignore
-        )
-    }
+
+def output_name(template_name):
+    """Get the path a template renders to, relative to the output directory."""
+    stem = Path(template_name).stem
+    if template_name.endswith(".md"):
+        return f"posts/{stem}/index.html"
+    if template_name in ["index.html", "404.html"]:
+        return template_name
+    return f"{stem}/index.html"
 
 
 def render_md(site, template, **kwargs):
-    stem = Path(template.name).stem
-    out = site.outpath / Path("posts/") / Path(stem) / Path("index.html")
+    out = site.outpath / Path(output_name(template.name))
     os.makedirs(out.parent, exist_ok=True)
     site.get_template("_post.html").stream(**kwargs).dump(str(out), encoding="utf-8")
 
 
 def render_html(site, template, **kwargs):
-    if template.name in ["index.html", "404.html"]:
-        out = site.outpath / Path(template.name)
-    else:
-        stem = Path(template.name).stem
-        out = site.outpath / Path(stem) / Path("index.html")
+    out = site.outpath / Path(output_name(template.name))
     os.makedirs(out.parent, exist_ok=True)
     template.stream(**kwargs).dump(str(out), encoding="utf-8")
 
 
-def load_posts(posts_dir="src/posts"):
-    posts = []
-    for post_path in Path(posts_dir).glob("*.md"):
-        post = frontmatter.load(str(post_path))
-        content = markdowner.convert(post.content)
-
-        posts.append(
-            Post(
-                title=post.metadata.get("title", "Untitled"),  # type: ignore
-                date=post.metadata.get("date", datetime.now().date()),  # type: ignore
-                excerpt=post.metadata.get("excerpt", ""),  # type: ignore
-                url=f"/posts/{post_path.stem}/",
-                content=content,
-                tags=post.metadata.get("tags", []),  # type: ignore
+def render_pages(site, template_name, pages, manifest=None, profile=None, salt="", **context):
+    """Render one template once per page of a paginated listing.
+
+    Each page gets ``page`` and, as ``posts``, the items on it. ``salt`` is
+    mixed into every page's manifest key.
+    """
+    from webcore.profiling import BuildProfile
+
+    profile = profile or BuildProfile(enabled=False)
+    for page in pages:
+        page_context = dict(context, page=page, posts=page.items)
+        if manifest is not None:
+            from webcore.manifest import hash_bytes, template_digest
+
+            key = template_digest(
+                site.env, template_name, dict(site.env.globals, **page_context)
             )
-        )
-    return sorted(posts, key=lambda x: x.date, reverse=True)
+            if salt:
+                key = hash_bytes(key.encode(), salt.encode())
+            if manifest.is_fresh(Path(site.outpath), page.output, key):
+                continue
+            manifest.record(page.output, key)
+        out = site.outpath / Path(page.output)
+        os.makedirs(out.parent, exist_ok=True)
+        with profile.file("render", page.output, out):
+            site.get_template(template_name).stream(**page_context).dump(
+                str(out), encoding="utf-8"
+            )
+
+
+def generate_listing_pages(site, summaries, page_size=0, manifest=None, profile=None, salt=""):
+    from webcore.pagination import paginate
 
+    pages = paginate(summaries, "/posts/", page_size)
+    render_pages(site, "posts.html", pages, manifest, profile, salt)
+    return pages
 
-POSTS = load_posts()
 
+def generate_tag_pages(site, summaries, page_size=0, manifest=None, profile=None, salt=""):
+    from webcore.pagination import paginate
 
-def generate_tag_pages(site, posts):
     tags = {}
-    for post in posts:
+    all_pages = []
+    for post in summaries:
         for tag in post.tags:
-            if tag not in tags:
-                tags[tag] = []
-            tags[tag].append(post)
+            tags.setdefault(tag, []).append(post)
 
-    for tag, tagged_posts in tags.items():
-        out = site.outpath / Path("posts/tag") / Path(tag) / Path("index.html")
-        os.makedirs(out.parent, exist_ok=True)
-        site.get_template("_tag.html").stream(tag=tag, posts=tagged_posts).dump(
-            str(out), encoding="utf-8"
-        )
+    for tag, tagged in tags.items():
+        pages = paginate(tagged, f"/posts/tag/{tag}/", page_size)
+        render_pages(site, "_tag.html", pages, manifest, profile, salt, tag=tag)
+        all_pages.extend(pages)
+    return all_pages
+
+
+def read_git_head(git_dir=".git"):
+    """Resolve HEAD by reading the repository files, without running git.
+
+    Handles detached HEADs, loose and packed refs, and worktrees whose
+    ``.git`` is a file pointing at the real git directory.
+
+    Args:
+        git_dir (str): Path to the ``.git`` directory or file.
+
+    Returns:
+        str: The full commit hash, or empty string if it can't be resolved.
+    """
+    git_dir = Path(git_dir)
+    try:
+        if git_dir.is_file():
+            gitdir = git_dir.read_text().strip().removeprefix("gitdir:").strip()
+            git_dir = (git_dir.parent / gitdir).resolve()
+        head = (git_dir / "HEAD").read_text().strip()
+    except OSError:
+        return ""
+    if not head.startswith("ref:"):
+        return head
+
+    ref = head.removeprefix("ref:").strip()
+    common_dir = git_dir
+    if (git_dir / "commondir").is_file():
+        common_dir = (git_dir / (git_dir / "commondir").read_text().strip()).resolve()
+    for base in (git_dir, common_dir):
+        try:
+            return (base / ref).read_text().strip()
+        except OSError:
+            pass
+    try:
+        with open(common_dir / "packed-refs", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(("#", "^")):
+                    continue
+                sha, _, name = line.strip().partition(" ")
+                if name == ref:
+                    return sha
+    except OSError:
+        pass
+    return ""
 
 
 def get_git_commit_hash(short=False):
     """Get the current git commit hash.
 
+    Reads ``.git`` directly and only falls back to a single ``git rev-parse``
+    call when that fails.
+
     Args:
         short (bool): If True, return the shortened version of the hash.
 
     Returns:
         str: The commit hash, or empty string if not in a git repository.
     """
-    try:
-        if short:
-            return subprocess.check_output(
-                ["git", "rev-parse", "--short", "HEAD"], text=True
+    commit = read_git_head()
+    if not commit:
+        try:
+            commit = subprocess.check_output(
+                ["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL
             ).strip()
-        else:
-            return subprocess.check_output(
-                ["git", "rev-parse", "HEAD"], text=True
-            ).strip()
-    except subprocess.CalledProcessError:
-        return ""
+        except (subprocess.CalledProcessError, OSError):
+            return ""
+    return commit[:7] if short else commit
 
 
-ENV_GLOBALS = {
-    "year": str(datetime.now().year),
-    "recent_posts": POSTS[:5],
-    "posts": POSTS,
-    "commit": get_git_commit_hash(short=True),
-    "commit_full": get_git_commit_hash(short=False),
-}
+def env_globals():
+    """Globals shared by every template, computed when a build starts."""
+    commit = get_git_commit_hash()
+    return {
+        "year": str(datetime.now().year),
+        "commit": commit[:7],
+        "commit_full": commit,
+    }
 
 
 def skip_render(*args, **kwargs):
     pass
 
 
-def build() -> None:
-    shutil.rmtree("build", ignore_errors=True)
-    site = Site.make_site(
-        searchpath="src",
-        outpath="build",
-        staticpaths=["static"],
-        contexts=[
-            (r".*\.md", md_context),
-        ],
-        rules=[
-            (r".*\.md", render_md),
-            (r".*\.html", render_html),
-        ],
-        env_globals=ENV_GLOBALS,
-    )
+MANIFEST_PATH = Path(".cache/manifest.json")
+# The code that turns src/ into build/; changing any of it rebuilds everything.
+GENERATOR_SOURCES = [
+    Path(__file__),
+    *sorted(Path(__file__).parent.glob("webcore/*.py")),
+    *sorted(Path(__file__).parent.glob("webcore/*.js")),
+]
+RENDER_CACHE = RenderCache(Path(".cache/render"))
+HIGHLIGHT_CACHE = RenderCache(Path(".cache/highlight"))
+MATH_CACHE = RenderCache(Path(".cache/math"))
+# Rendered once per page by generate_listing_pages() instead of as-is.
+PAGINATED_TEMPLATES = {"posts.html"}
+IMAGE_CACHE = Path(".cache/images")
 
-    site.render()
-    generate_tag_pages(site, POSTS)
 
+@dataclass
+class BuildResult:
+    """What a build wrote, relative to the output directory."""
 
-class RebuildHandler(FileSystemEventHandler):
-    def __init__(self, build_func):
-        self.build_func = build_func
-        self.original_dir = os.getcwd()
+    written: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    seconds: float = 0.0
 
-    def on_any_event(self, event):
-        if not event.is_directory:
-            print(f"Change detected: {event.src_path}. Rebuilding...")
 
-            current_dir = os.getcwd()
+def template_key(site, manifest, template_name, layouts, content="", salt=""):
+    """Hash everything that goes into rendering a template or post.
 
-            try:
-                os.chdir(self.original_dir)
-                self.build_func()
-            finally:
-                os.chdir(current_dir)
+    Args:
+        layouts (dict): Digests of layout templates already computed during
+            this build, so ``_post.html`` is only hashed once.
+        content (str): For posts, the rendered body, which also depends on
+            the images it uses.
+        salt (str): Anything else the output depends on, e.g. the digest of
+            the stylesheets inlined into it afterwards.
+    """
+    from webcore.manifest import hash_bytes, template_digest
 
+    if template_name.endswith(".md"):
+        source = manifest.file_digest(Path(site.searchpath) / template_name)
+        if "_post.html" not in layouts:
+            layouts["_post.html"] = template_digest(
+                site.env, "_post.html", site.env.globals
+            )
+        return hash_bytes(
+            source.encode(), layouts["_post.html"].encode(), content.encode(), salt.encode()
+        )
+    key = template_digest(site.env, template_name, site.env.globals)
+    return hash_bytes(key.encode(), salt.encode()) if salt else key
 
-def run_server(directory="build", port=8000):
-    """Run a simple HTTP server to serve the built site"""
-    handler = http.server.SimpleHTTPRequestHandler
-    os.chdir(directory)
 
-    with socketserver.TCPServer(("", port), handler) as httpd:
-        print(f"Serving at http://localhost:{port}")
-        httpd.serve_forever()
+def critical_stylesheets(site, assets):
+    """Text of every local stylesheet, by the URL pages link to it with."""
+    if assets is not None:
+        return {
+            f"/{assets.hashed[name]}": css for name, css in assets.stylesheets.items()
+        }
+    return {
+        f"/{name}": (Path(site.searchpath) / name).read_text(encoding="utf-8")
+        for name in site.static_names
+        if name.endswith(".css")
+    }
 
 
-def watch_and_build(path="src", port=8000):
-    abs_path = os.path.abspath(path)
-    if not os.path.exists(abs_path):
-        os.makedirs(abs_path, exist_ok=True)
-        print(f"Created missing directory: {abs_path}")
+def publish_static(site, manifest, static_names, mode="auto"):
+    """Publish the static files whose content changed since they were last published.
 
-    build()
+    Args:
+        mode (str): How files are placed in the output; see
+            :func:`webcore.publish.publish_file`.
+    """
+    from webcore.publish import publish_files
+
+    outpath = Path(site.outpath)
+    to_publish = []
+    for static_name in static_names:
+        key = manifest.file_digest(Path(site.searchpath) / static_name)
+        if manifest.is_fresh(outpath, static_name, key):
+            continue
+        to_publish.append(static_name)
+        manifest.record(static_name, key)
+    methods = publish_files(site.searchpath, outpath, to_publish, mode)
+    if methods:
+        print(
+            f"Published {len(to_publish)} static files ("
+            + ", ".join(f"{n} {method}" for method, n in sorted(methods.items()))
+            + f"), {len(static_names) - len(to_publish)} unchanged"
+        )
 
-    original_dir = os.getcwd()
 
-    server_thread = threading.Thread(target=run_server, args=("build", port))
-    server_thread.daemon = True
-    server_thread.start()
+def static_changes(changed, searchpath="src", fingerprint=True, critical_css=True):
+    """Map changed paths to static file names, or None if any isn't static.
 
-    event_handler = RebuildHandler(build)
-    observer = Observer()
-    observer.schedule(event_handler, abs_path, recursive=True)
+    Images count as non-static, since posts embed their dimensions, and so
+    does anything fingerprinted, since pages link to it by its hash, and
+    stylesheets when pages have their rules inlined.
+    """
+    from webcore.assets import is_fingerprintable
+    from webcore.images import IMAGE_SUFFIXES
+
+    names = []
+    for path in changed:
+        rel = Path(os.path.relpath(os.path.abspath(path), os.path.abspath(searchpath)))
+        if rel.parts[:1] != ("static",) or rel.suffix.lower() in IMAGE_SUFFIXES:
+            return None
+        if fingerprint and is_fingerprintable(rel.as_posix()):
+            return None
+        if critical_css and rel.suffix.lower() == ".css":
+            return None
+        names.append(rel.as_posix())
+    return names
+
+
+def build(
+    incremental: bool = False,
+    jobs: int = 1,
+    use_cache: bool = True,
+    strict_highlight: bool = False,
+    highlight_report: bool = False,
+    changed: Optional[Iterable[str]] = None,
+    precompress: bool = False,
+    static_mode: str = "auto",
+    fingerprint: bool = True,
+    page_size: int = 20,
+    critical_css: bool = True,
+    image_variants: bool = True,
+    profile=None,
+) -> BuildResult:
+    """Render the site into ``build/``.
 
-    try:
-        observer.start()
-    except FileNotFoundError:
-        print(
-            f"Error: Could not watch directory {abs_path}. Please make sure it exists."
+    Args:
+        incremental (bool): If True, keep the previous output and only rewrite
+            files whose inputs changed since the last build, according to the
+            manifest at ``MANIFEST_PATH``. Otherwise start from an empty tree.
+        jobs (int): Number of processes used to parse and render posts.
+        use_cache (bool): If True, reuse post HTML from ``RENDER_CACHE`` when
+            neither the post body nor the markdown setup changed, and
+            highlighted code blocks and converted math from
+            ``HIGHLIGHT_CACHE`` and ``MATH_CACHE``.
+        strict_highlight (bool): Render code blocks without a language as
+            plain text instead of letting Pygments guess.
+        highlight_report (bool): Print highlighting time, cache hits and the
+            code blocks whose language was guessed. Skips ``RENDER_CACHE``,
+            since posts taken from it are never highlighted.
+        changed (list): Paths known to have changed since the last build. For
+            an incremental build where they're all static files, only those
+            files are copied or removed and nothing is rendered.
+        precompress (bool): Write ``.gz`` (and ``.br``, if brotli is
+            installed) copies of compressible outputs next to them.
+        static_mode (str): How static files are published: ``"auto"``
+            reflinks or hard-links them where the filesystem allows and
+            copies otherwise; ``"copy"`` always copies.
+        fingerprint (bool): Also publish stylesheets, scripts, images and
+            fonts under content-hashed names and link to those.
+        page_size (int): Posts per page on the post list and tag pages; 0
+            puts every post on one page.
+        critical_css (bool): Inline the CSS rules each page uses and load
+            stylesheets without blocking rendering.
+        image_variants (bool): Generate AVIF/WebP copies of post images and
+            offer them in ``<picture>`` elements.
+        profile (BuildProfile): If given, stage and per-file timings are
+            recorded in it.
+
+    Returns:
+        BuildResult: The outputs written and removed, and the time taken.
+    """
+    from staticjinja import Site  # type: ignore[import]
+    from webcore.assets import AssetMap
+    from webcore.critical import CriticalCSS
+    from webcore.feeds import write_feeds
+    from webcore.highlight import HighlightStats, format_report
+    from webcore.images import ImagePipeline
+    from webcore.manifest import BuildManifest, generator_digest, hash_bytes
+    from webcore.posts import RenderOptions, load_posts
+    from webcore.profiling import BuildProfile
+    from webcore.search import write_index as write_search_index
+
+    start = time.perf_counter()
+    profile = profile or BuildProfile(enabled=False)
+    generator = generator_digest(
+        GENERATOR_SOURCES,
+        dict(
+            strict_highlight=strict_highlight,
+            fingerprint=fingerprint,
+            page_size=page_size,
+            critical_css=critical_css,
+            image_variants=image_variants,
+        ),
+    )
+
+    if incremental and changed is not None:
+        names = static_changes(changed, fingerprint=fingerprint, critical_css=critical_css)
+        manifest = BuildManifest.load(MANIFEST_PATH, generator)
+        # After a code change, everything needs rendering again.
+        if names is not None and not manifest.invalidated:
+            manifest.carry_over(exclude=names)
+            site = Site.make_site(
+                searchpath="src", outpath="build", staticpaths=["static"]
+            )
+            with profile.stage("static", manifest, site.outpath):
+                publish_static(
+                    site,
+                    manifest,
+                    [n for n in names if Path("src", n).is_file()],
+                    mode=static_mode,
+                )
+            return finish_build(
+                manifest,
+                Path(site.outpath),
+                start,
+                precompress=precompress,
+                jobs=jobs,
+                profile=profile,
+            )
+
+    options = RenderOptions(
+        # Whole cached posts skip markdown and the highlighter, so they would
+        # be missing from the report; their code blocks still hit HIGHLIGHT_CACHE.
+        cache=RENDER_CACHE if use_cache and not highlight_report else None,
+        highlight_cache=HIGHLIGHT_CACHE if use_cache else None,
+        math_cache=MATH_CACHE if use_cache else None,
+        strict_highlight=strict_highlight,
+    )
+    stats = HighlightStats()
+    timings = {}
+    # Every post is parsed exactly once; the listings and the per-post pages
+    # (through md_context) all share these objects.
+    with profile.stage("load posts"):
+        posts = load_posts(jobs=jobs, options=options, stats=stats, timings=timings)
+    for path, timing in timings.items():
+        profile.add_file("parse", path, sum(timing.values()))
+        for part, seconds in timing.items():
+            profile.add_part("load posts", part, seconds)
+    profile.add_part("load posts", "pygments", stats.seconds)
+    if highlight_report:
+        print(format_report(stats))
+    post_index = {post.url: post for post in posts}
+    # Listings only ever see summaries, never the rendered bodies.
+    summaries = [post.summary() for post in posts]
+
+    if incremental:
+        manifest = BuildManifest.load(MANIFEST_PATH, generator)
+    else:
+        shutil.rmtree("build", ignore_errors=True)
+        manifest = BuildManifest(MANIFEST_PATH, generator=generator)
+
+    with profile.stage("images", manifest, "build"):
+        ImagePipeline(
+            "src", "build", manifest, IMAGE_CACHE, jobs=jobs, variants=image_variants
+        ).process(posts)
+
+    site = Site.make_site(
+        searchpath="src",
+        outpath="build",
+        staticpaths=["static"],
+        contexts=[
+            (r".*\.md", partial(md_context, post_index=post_index)),
+        ],
+        rules=[
+            (r".*\.md", render_md),
+            (r".*\.html", render_html),
+        ],
+        env_globals=dict(env_globals(), recent_posts=summaries[:5], posts=summaries),
+    )
+
+    outpath = Path(site.outpath)
+    layouts = {}
+
+    assets = None
+    with profile.stage("assets"):
+        if fingerprint:
+            assets = AssetMap(site.searchpath, site.static_names, manifest)
+            site.env.globals["assets"] = assets.urls()
+            for post in posts:
+                post.content = assets.rewrite_html(post.content)
+        else:
+            site.env.globals["assets"] = {f"/{n}": f"/{n}" for n in site.static_names}
+
+    # Pages have the stylesheets inlined into them after rendering, so they
+    # must be rendered again whenever one changes, even under the same URL.
+    stylesheets = {}
+    style_key = ""
+    if critical_css:
+        stylesheets = critical_stylesheets(site, assets)
+        style_key = hash_bytes(
+            *(f"{url}\0{css}".encode() for url, css in sorted(stylesheets.items()))
         )
-        return
 
-    print(
-        f"Watching '{abs_path}' for changes. Site available at http://localhost:{port}"
+    with profile.stage("templates", manifest, outpath):
+        for template in site.templates:
+            if template.name in PAGINATED_TEMPLATES:
+                continue
+            name = output_name(template.name)
+            content = ""
+            if template.name.endswith(".md"):
+                content = md_context(template, post_index)["post"].content
+            key = template_key(site, manifest, template.name, layouts, content, style_key)
+            if manifest.is_fresh(outpath, name, key):
+                continue
+            with profile.file("render", name, outpath / name):
+                site.render_template(template)
+            manifest.record(name, key)
+
+    with profile.stage("static", manifest, outpath):
+        publish_static(site, manifest, site.static_names, mode=static_mode)
+        if assets is not None:
+            assets.publish(outpath, mode=static_mode)
+
+    with profile.stage("listings", manifest, outpath):
+        pages = generate_listing_pages(site, summaries, page_size, manifest, profile, style_key)
+        pages += generate_tag_pages(site, summaries, page_size, manifest, profile, style_key)
+
+    if critical_css:
+        with profile.stage("critical css"):
+            critical = CriticalCSS(stylesheets)
+            # Only rendered pages; static files may be linked to their sources.
+            static = set(site.static_names)
+            rendered = [output for output in manifest.written if output not in static]
+            if critical.process(outpath, rendered):
+                print(critical.stats.summary())
+
+    with profile.stage("search index", manifest, outpath):
+        write_search_index(outpath, posts, manifest)
+
+    # Last, since the sitemap lists every page the build produced.
+    with profile.stage("feeds", manifest, outpath):
+        write_feeds(outpath, posts, pages, manifest)
+
+    return finish_build(
+        manifest, outpath, start, precompress=precompress, jobs=jobs, profile=profile
+    )
+
+
+def finish_build(manifest, outpath, start, precompress=False, jobs=1, profile=None):
+    from webcore.profiling import BuildProfile
+
+    profile = profile or BuildProfile(enabled=False)
+    if precompress:
+        from webcore import compress
+
+        with profile.stage("precompress", manifest, outpath):
+            print(compress.precompress(outpath, manifest, jobs=jobs).summary())
+    with profile.stage("finish"):
+        removed = manifest.prune(outpath)
+        for name in removed:
+            print(f"Removed stale output {name}")
+        manifest.save()
+    profile.seconds = time.perf_counter() - start
+    return BuildResult(
+        written=manifest.written,
+        removed=removed,
+        seconds=time.perf_counter() - start,
     )
-    print("Press Ctrl+C to stop.")
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        observer.stop()
-        os.chdir(original_dir)
-    observer.join()
 
 
 if __name__ == "__main__":
@@ -251,6 +540,102 @@ if __name__ == "__main__":
     parser.add_argument(
         "--port", type=int, default=3000, help="Port for the development server"
     )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="Compress text responses from the development server (gzip, or brotli if installed)",
+    )
+    parser.add_argument(
+        "--precompress",
+        action="store_true",
+        help="Write .gz (and .br, if brotli is installed) files next to compressible outputs",
+    )
+    parser.add_argument(
+        "--static-mode",
+        choices=["auto", "reflink", "hardlink", "copy"],
+        default="auto",
+        help="How static files are published: reflink or hard-link where possible (auto), or always copy",
+    )
+    parser.add_argument(
+        "--no-fingerprint",
+        action="store_true",
+        help="Don't publish assets under content-hashed names (implied by --serve)",
+    )
+    parser.add_argument(
+        "--no-critical-css",
+        action="store_true",
+        help="Link stylesheets as-is instead of inlining the rules each page uses (implied by --serve)",
+    )
+    parser.add_argument(
+        "--no-image-variants",
+        action="store_true",
+        help="Don't generate AVIF/WebP copies of post images",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=20,
+        help="Posts per page on the post list and tag pages (0 = no pagination)",
+    )
+    parser.add_argument(
+        "--no-livereload",
+        action="store_true",
+        help="Don't reload pages in the browser after a rebuild",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes used to render posts (0 = one per CPU)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only rebuild outputs whose inputs changed since the last build",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Render every post from scratch without reading or writing the render cache",
+    )
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="Empty the render, highlight and image caches before building",
+    )
+    parser.add_argument(
+        "--strict-highlight",
+        action="store_true",
+        help="Don't guess the language of code blocks that don't specify one",
+    )
+    parser.add_argument(
+        "--highlight-report",
+        action="store_true",
+        help="Report highlighting time and code blocks whose language was guessed",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print time spent and bytes written per build stage, and the slowest files",
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=10,
+        metavar="N",
+        help="Number of slowest files listed by --profile",
+    )
+    parser.add_argument(
+        "--profile-json",
+        metavar="PATH",
+        help="Write the build profile as JSON (implies --profile)",
+    )
+    parser.add_argument(
+        "--profile-pstats",
+        metavar="PATH",
+        help="Also run the build under cProfile and save the stats (worker processes aren't included)",
+    )
     parser.add_argument(
         "--about", action="store_true", help="Print information about webcore"
     )
@@ -258,8 +643,64 @@ if __name__ == "__main__":
     
     if args.about:
         print("webcore v3 :3 - https://n3rdl0rd.xyz/webcore")
+        raise SystemExit(0)
+
+    jobs = args.jobs or os.cpu_count() or 1
+    use_cache = not args.no_cache
+
+    if args.clear_cache:
+        RENDER_CACHE.clear()
+        HIGHLIGHT_CACHE.clear()
+        MATH_CACHE.clear()
+        shutil.rmtree(IMAGE_CACHE, ignore_errors=True)
+
+    build_options = dict(
+        jobs=jobs,
+        use_cache=use_cache,
+        strict_highlight=args.strict_highlight,
+        highlight_report=args.highlight_report,
+        precompress=args.precompress,
+        static_mode=args.static_mode,
+        fingerprint=not args.no_fingerprint,
+        page_size=args.page_size,
+        critical_css=not args.no_critical_css,
+        image_variants=not args.no_image_variants,
+    )
 
     if args.serve:
-        watch_and_build(port=args.port)
+        from webcore.serve import watch_and_build
+
+        # Hashed names and inlined CSS would make every stylesheet edit change
+        # every page, so livereload could never swap stylesheets in place.
+        build_options.update(fingerprint=False, critical_css=False)
+
+        watch_and_build(
+            partial(build, **build_options),
+            partial(build, incremental=True, **build_options),
+            port=args.port,
+            compress=args.compress,
+            livereload=not args.no_livereload,
+        )
+    elif args.profile or args.profile_json or args.profile_pstats:
+        from webcore.profiling import BuildProfile
+
+        profile = BuildProfile()
+        run = partial(build, incremental=args.incremental, profile=profile, **build_options)
+        if args.profile_pstats:
+            import cProfile
+
+            profiler = cProfile.Profile()
+            profiler.runcall(run)
+            profiler.dump_stats(args.profile_pstats)
+        else:
+            run()
+        print(profile.report(args.profile_top))
+        if args.profile_json:
+            profile.dump(
+                args.profile_json,
+                commit=get_git_commit_hash(),
+                timestamp=datetime.now().isoformat(timespec="seconds"),
+                options=dict(build_options, incremental=args.incremental),
+            )
     else:
-        build()
\ No newline at end of file
+        build(incremental=args.incremental, **build_options)
\ No newline at end of file
@@ -0,0 +1,293 @@
+// Queries the index written by webcore/search.py. tokenize(), stem() and
+// shardOf() must stay in step with their Python counterparts.
+(function (root) {
+    "use strict";
+
+    var TOKEN = /[\p{L}\p{N}_]+/gu;
+    var ALPHA = /^\p{L}+$/u;
+    var SUFFIXES = [
+        ["ational", "ate"],
+        ["ization", "ize"],
+        ["ingly", ""],
+        ["edly", ""],
+        ["ment", ""],
+        ["ness", ""],
+        ["ing", ""],
+        ["ed", ""],
+        ["ly", ""],
+    ];
+
+    function stem(word) {
+        if (word.length <= 3 || !ALPHA.test(word)) {
+            return word;
+        }
+        if (word.endsWith("ies")) {
+            word = word.slice(0, -3) + "y";
+        } else if (word.endsWith("sses")) {
+            word = word.slice(0, -2);
+        } else if (word.endsWith("s") && !/(ss|us|is)$/.test(word)) {
+            word = word.slice(0, -1);
+        }
+        for (var i = 0; i < SUFFIXES.length; i++) {
+            var suffix = SUFFIXES[i][0];
+            if (word.endsWith(suffix) && word.length - suffix.length >= 3) {
+                word = word.slice(0, -suffix.length) + SUFFIXES[i][1];
+                break;
+            }
+        }
+        if (word.length > 3 && word.endsWith("e")) {
+            word = word.slice(0, -1);
+        }
+        var last = word[word.length - 1];
+        if (word.length > 3 && last === word[word.length - 2] && "lsz".indexOf(last) === -1) {
+            word = word.slice(0, -1);
+        }
+        return word;
+    }
+
+    function tokenize(text, stopWords) {
+        return (text.toLowerCase().match(TOKEN) || [])
+            .filter(function (t) { return !stopWords.has(t); })
+            .map(stem);
+    }
+
+    // FNV-1a over the UTF-8 bytes of the term.
+    function shardOf(term, shards) {
+        var bytes = new TextEncoder().encode(term);
+        var h = 0x811c9dc5;
+        for (var i = 0; i < bytes.length; i++) {
+            h = Math.imul(h ^ bytes[i], 0x01000193) >>> 0;
+        }
+        return h % shards;
+    }
+
+    // Quoted parts of the query are phrases; everything else is single terms.
+    function parseQuery(query) {
+        var phrases = [];
+        var rest = query.replace(/"([^"]*)"/g, function (_, phrase) {
+            phrases.push(phrase);
+            return " ";
+        });
+        return { phrases: phrases, rest: rest };
+    }
+
+    // {doc: {field: [positions]}} for one term.
+    function decode(list) {
+        var result = new Map();
+        var doc = 0;
+        var i = 0;
+        while (i < list.length) {
+            doc += list[i];
+            var field = list[i + 1];
+            var count = list[i + 2];
+            var positions = new Array(count);
+            var position = 0;
+            for (var j = 0; j < count; j++) {
+                position += list[i + 3 + j];
+                positions[j] = position;
+            }
+            i += 3 + count;
+            if (!result.has(doc)) {
+                result.set(doc, new Map());
+            }
+            result.get(doc).set(field, positions);
+        }
+        return result;
+    }
+
+    function hasPhrase(fields, terms) {
+        var first = fields.get(terms[0]);
+        for (var [field, starts] of first) {
+            for (var s = 0; s < starts.length; s++) {
+                var ok = true;
+                for (var k = 1; k < terms.length && ok; k++) {
+                    var positions = fields.get(terms[k]).get(field);
+                    ok = positions !== undefined && positions.indexOf(starts[s] + k) !== -1;
+                }
+                if (ok) {
+                    return true;
+                }
+            }
+        }
+        return false;
+    }
+
+    /**
+     * @param {string} base URL of the index directory, ending in "/".
+     * @param {function} [fetchJSON] Loads a URL and resolves to parsed JSON.
+     */
+    function SearchIndex(base, fetchJSON) {
+        this.base = base;
+        this.fetchJSON = fetchJSON || function (url) {
+            return fetch(url).then(function (r) { return r.json(); });
+        };
+        this.meta = null;
+        this.docs = null;
+        this.shards = new Map();
+        this.terms = new Map();
+    }
+
+    SearchIndex.prototype.load = function () {
+        var self = this;
+        if (!self.ready) {
+            self.ready = self.fetchJSON(self.base + "meta.json").then(function (meta) {
+                self.meta = meta;
+                self.stopWords = new Set(meta.stopWords);
+                return self.fetchJSON(self.base + meta.docs);
+            }).then(function (docs) {
+                self.docs = docs;
+            });
+        }
+        return self.ready;
+    };
+
+    SearchIndex.prototype.shard = function (n) {
+        var self = this;
+        if (!self.shards.has(n)) {
+            self.shards.set(n, self.fetchJSON(self.base + self.meta.shards[n]));
+        }
+        return self.shards.get(n);
+    };
+
+    SearchIndex.prototype.postings = function (term) {
+        var self = this;
+        if (self.terms.has(term)) {
+            return Promise.resolve(self.terms.get(term));
+        }
+        return self.shard(shardOf(term, self.meta.shards.length)).then(function (shard) {
+            var postings = decode(shard[term] || []);
+            self.terms.set(term, postings);
+            return postings;
+        });
+    };
+
+    /**
+     * Find the posts containing every term and phrase of the query.
+     *
+     * @returns {Promise<Array>} Up to `limit` results, best first, each
+     *     {url, title, date, excerpt, score}.
+     */
+    SearchIndex.prototype.search = function (query, limit) {
+        var self = this;
+        limit = limit || 20;
+        return self.load().then(function () {
+            var parsed = parseQuery(query);
+            var phrases = parsed.phrases
+                .map(function (p) { return tokenize(p, self.stopWords); })
+                .filter(function (p) { return p.length > 0; });
+            var terms = tokenize(parsed.rest, self.stopWords);
+            phrases.forEach(function (p) { terms = terms.concat(p); });
+            terms = Array.from(new Set(terms));
+            if (terms.length === 0) {
+                return [];
+            }
+            return Promise.all(terms.map(function (t) { return self.postings(t); }))
+                .then(function (lists) {
+                    return self.rank(terms, lists, phrases, limit);
+                });
+        });
+    };
+
+    SearchIndex.prototype.rank = function (terms, lists, phrases, limit) {
+        var count = this.meta.count;
+        var weights = this.meta.weights;
+        var byTerm = new Map();
+        terms.forEach(function (t, i) { byTerm.set(t, lists[i]); });
+
+        // Only posts that contain every term, starting from the rarest.
+        var order = lists.slice().sort(function (a, b) { return a.size - b.size; });
+        var results = [];
+        for (var [doc] of order[0]) {
+            if (!order.every(function (l) { return l.has(doc); })) {
+                continue;
+            }
+            var fieldsByTerm = new Map();
+            terms.forEach(function (t) { fieldsByTerm.set(t, byTerm.get(t).get(doc)); });
+            if (!phrases.every(function (p) { return hasPhrase(fieldsByTerm, p); })) {
+                continue;
+            }
+            var score = 0;
+            terms.forEach(function (t) {
+                var idf = Math.log(1 + count / byTerm.get(t).size);
+                for (var [field, positions] of fieldsByTerm.get(t)) {
+                    score += weights[field] * (1 + Math.log(positions.length)) * idf;
+                }
+            });
+            results.push({ doc: doc, score: score });
+        }
+        results.sort(function (a, b) { return b.score - a.score || a.doc - b.doc; });
+        var docs = this.docs;
+        return results.slice(0, limit).map(function (r) {
+            var d = docs[r.doc];
+            return { url: d[0], title: d[1], date: d[2], excerpt: d[3], score: r.score };
+        });
+    };
+
+    function bindForm(form) {
+        var input = form.querySelector("input[type=search]");
+        var list = document.getElementById(form.dataset.results);
+        var status = document.getElementById(form.dataset.status);
+        var index = new SearchIndex(form.dataset.index);
+        var timer = null;
+        var latest = 0;
+
+        function render(query, results) {
+            list.replaceChildren();
+            results.forEach(function (r) {
+                var item = document.createElement("article");
+                item.className = "post-card";
+                var meta = document.createElement("div");
+                meta.className = "card-meta";
+                meta.textContent = r.date;
+                var title = document.createElement("h3");
+                var link = document.createElement("a");
+                link.href = r.url;
+                link.textContent = r.title;
+                title.appendChild(link);
+                var excerpt = document.createElement("p");
+                excerpt.textContent = r.excerpt;
+                item.append(meta, title, excerpt);
+                list.appendChild(item);
+            });
+            status.textContent = query
+                ? results.length + (results.length === 1 ? " result" : " results")
+                : "";
+        }
+
+        function run() {
+            var query = input.value.trim();
+            var id = ++latest;
+            history.replaceState(null, "", query ? "?q=" + encodeURIComponent(query) : location.pathname);
+            if (!query) {
+                render("", []);
+                return;
+            }
+            index.search(query).then(function (results) {
+                if (id === latest) {
+                    render(query, results);
+                }
+            });
+        }
+
+        form.addEventListener("submit", function (event) {
+            event.preventDefault();
+            run();
+        });
+        input.addEventListener("input", function () {
+            clearTimeout(timer);
+            timer = setTimeout(run, 100);
+        });
+        input.value = new URLSearchParams(location.search).get("q") || "";
+        if (input.value) {
+            run();
+        }
+    }
+
+    var api = { SearchIndex: SearchIndex, tokenize: tokenize, stem: stem, shardOf: shardOf };
+    if (typeof module !== "undefined" && module.exports) {
+        module.exports = api;
+    } else {
+        root.webcoreSearch = api;
+        document.querySelectorAll("form[data-index]").forEach(bindForm);
+    }
+})(this);
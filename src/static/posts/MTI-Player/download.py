@@ -0,0 +1,137 @@
+"""Shared track downloader for poc_production.py and poc_rehearsal.py.
+
+Tracks are downloaded a few at a time over one pooled session, into
+``<name>.part`` files that are resumed with a Range request if a run is
+interrupted. Each show directory gets a ``manifest.json`` with the size and
+SHA-256 of every finished track; tracks whose file already has the size the
+manifest (or the server) says they should are skipped.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+WORKERS = 4
+CHUNK_SIZE = 1024 * 1024
+MANIFEST = "manifest.json"
+
+
+def make_session(pool_size=WORKERS):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest
+
+
+def remote_size(session, url):
+    """Return the server's Content-Length for the URL, or None if it doesn't say."""
+    try:
+        response = session.head(url, allow_redirects=True)
+    except requests.exceptions.RequestException:
+        return None
+    length = response.headers.get("Content-Length")
+    return int(length) if response.status_code == 200 and length else None
+
+
+def download(session, url, path, expected=None):
+    """Download url to path, resuming from path + ".part" if it's there.
+
+    Args:
+        expected (dict): The track's manifest entry ({"size", "sha256"}), if any.
+
+    Returns the track's manifest entry and whether anything was downloaded.
+    Raises requests.exceptions.RequestException or ValueError on failure.
+    """
+    size = expected["size"] if expected else None
+    if os.path.exists(path):
+        if size is None:
+            size = remote_size(session, url)
+        if size is not None and os.path.getsize(path) == size:
+            return expected or {"size": size, "sha256": file_hash(path).hexdigest()}, False
+
+    part = path + ".part"
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with session.get(url, headers=headers, stream=True) as response:
+        if response.status_code == 416 and offset:
+            # The .part file already has every byte.
+            digest = file_hash(part)
+        elif response.status_code in (200, 206):
+            if response.status_code == 200:
+                # The server ignored the Range header, so start over.
+                offset = 0
+            digest = file_hash(part) if offset else hashlib.sha256()
+            with open(part, "ab" if offset else "wb") as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+        else:
+            response.raise_for_status()
+            raise requests.exceptions.HTTPError(f"unexpected status {response.status_code}", response=response)
+
+    entry = {"size": os.path.getsize(part), "sha256": digest.hexdigest()}
+    if expected and (expected["size"], expected["sha256"]) != (entry["size"], entry["sha256"]):
+        os.remove(part)
+        raise ValueError(f"doesn't match {MANIFEST} (remove its entry if the track changed)")
+    os.replace(part, path)
+    return entry, True
+
+
+def download_tracks(tracks, directory, workers=WORKERS):
+    """Download (file name, URL) pairs into directory, workers at a time.
+
+    Returns the number of tracks that failed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = load_manifest(directory)
+    failed = 0
+    with make_session(workers) as session, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(download, session, url, os.path.join(directory, name), manifest.get(name)): name
+            for name, url in tracks
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            name = futures[future]
+            try:
+                entry, downloaded = future.result()
+            except (requests.exceptions.RequestException, ValueError, OSError) as e:
+                print(f"[{done}/{len(futures)}] Error downloading {name}: {e}")
+                failed += 1
+                continue
+            if downloaded:
+                print(f"[{done}/{len(futures)}] Downloaded {name}.")
+            else:
+                print(f"[{done}/{len(futures)}] {name} is already downloaded.")
+            if manifest.get(name) != entry:
+                # Saved as tracks finish, so an interrupted run keeps what it verified.
+                manifest[name] = entry
+                save_manifest(directory, manifest)
+    return failed
@@ -5,7 +5,8 @@
 # ///
 
 import requests
-import os
+
+from download import download_tracks
 
 HEADERS = {
     "x-platform-id": "bd6dbdd5-778d-4013-9820-3727d263e140",
@@ -69,26 +70,13 @@ if response.status_code == 200:
     data = data['data']['getBookingForCode']
     show = data['show']['name']
     print(f"Show: {show}")
-    os.makedirs(show, exist_ok=True)
-    for track in data['production_tracks']:
-        location_url = track['location']
-        track_name = track['track_name']
-
-        file_name = f"{track['cue_number']}. {track_name}.mp3"
-        file_path = os.path.join(show, file_name)
-        
-        print(f"Downloading {track_name}...")
-        try:
-            file_response = requests.get(location_url, stream=True)
-            if file_response.status_code == 200:
-                with open(file_path, 'wb') as file:
-                    for chunk in file_response.iter_content(chunk_size=1024):
-                        if chunk:
-                            file.write(chunk)
-            else:
-                print(f"Failed to download {track_name}: {file_response.status_code}")
-        except requests.exceptions.RequestException as e:
-            print(f"Error downloading {track_name}: {e}")
+    tracks = [
+        (f"{track['cue_number']}. {track['track_name']}.mp3", track['location'])
+        for track in data['production_tracks']
+    ]
+    failed = download_tracks(tracks, show)
+    if failed:
+        print(f"{failed} of {len(tracks)} tracks failed; run again to resume them.")
 else:
     print("Failed to fetch data:", response.status_code, response.text)
 
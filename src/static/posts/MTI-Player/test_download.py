@@ -0,0 +1,141 @@
+"""Tests for download.py against a local HTTP server.
+
+Run from this directory with ``python -m unittest test_download``.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from download import download, download_tracks, load_manifest, make_session
+
+TRACK = bytes(range(256)) * 4096  # 1 MiB, so it spans a full chunk
+
+
+class TrackHandler(BaseHTTPRequestHandler):
+    """Serves TRACK at /track.mp3, honouring Range unless the server says not to."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def respond(self, body):
+        self.server.requests.append((self.command, self.headers.get("Range")))
+        if self.path != "/track.mp3":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        start = 0
+        match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range") or "")
+        if match and self.server.ranges:
+            start = int(match.group(1))
+            if start >= len(TRACK):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(TRACK)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(TRACK) - 1}/{len(TRACK)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(TRACK) - start))
+        self.end_headers()
+        if body:
+            self.wfile.write(TRACK[start:])
+
+
+class DownloadTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), TrackHandler)
+        self.server.ranges = True
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/track.mp3"
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "1. Overture.mp3")
+        self.session = make_session()
+
+    def tearDown(self):
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_fresh_download(self):
+        entry, downloaded = download(self.session, self.url, self.path)
+        self.assertTrue(downloaded)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), TRACK)
+        self.assertEqual(entry, {"size": len(TRACK), "sha256": hashlib.sha256(TRACK).hexdigest()})
+        self.assertFalse(os.path.exists(self.path + ".part"))
+
+    def test_resumes_from_part_file(self):
+        with open(self.path + ".part", "wb") as f:
+            f.write(TRACK[:1000])
+        entry, downloaded = download(self.session, self.url, self.path)
+        self.assertTrue(downloaded)
+        self.assertEqual(self.server.requests, [("GET", "bytes=1000-")])
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), TRACK)
+        self.assertEqual(entry["sha256"], hashlib.sha256(TRACK).hexdigest())
+
+    def test_complete_part_file(self):
+        with open(self.path + ".part", "wb") as f:
+            f.write(TRACK)
+        entry, downloaded = download(self.session, self.url, self.path)
+        self.assertEqual(self.server.requests, [("GET", f"bytes={len(TRACK)}-")])
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), TRACK)
+        self.assertEqual(entry["size"], len(TRACK))
+
+    def test_server_ignoring_range_restarts(self):
+        self.server.ranges = False
+        with open(self.path + ".part", "wb") as f:
+            f.write(b"stale bytes that must not stay in front")
+        entry, downloaded = download(self.session, self.url, self.path)
+        self.assertTrue(downloaded)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), TRACK)
+        self.assertEqual(entry["size"], len(TRACK))
+
+    def test_skips_complete_file(self):
+        with open(self.path, "wb") as f:
+            f.write(TRACK)
+        entry, downloaded = download(self.session, self.url, self.path)
+        self.assertFalse(downloaded)
+        self.assertEqual(self.server.requests, [("HEAD", None)])
+        self.assertEqual(entry["sha256"], hashlib.sha256(TRACK).hexdigest())
+
+    def test_manifest_mismatch_removes_part(self):
+        expected = {"size": len(TRACK), "sha256": "0" * 64}
+        with self.assertRaises(ValueError):
+            download(self.session, self.url, self.path, expected)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.path + ".part"))
+
+    def test_download_tracks(self):
+        tracks = [("1. Overture.mp3", self.url), ("2. Missing.mp3", self.url + ".gone")]
+        failed = download_tracks(tracks, self.tmp.name, workers=2)
+        self.assertEqual(failed, 1)
+        manifest = load_manifest(self.tmp.name)
+        self.assertEqual(list(manifest), ["1. Overture.mp3"])
+
+        # The manifest's size is enough to skip the track without asking the server.
+        self.server.requests.clear()
+        self.assertEqual(download_tracks(tracks[:1], self.tmp.name), 0)
+        self.assertEqual(self.server.requests, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
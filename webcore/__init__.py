@@ -0,0 +1 @@
+"""Helpers used by build.py to render the site."""
@@ -0,0 +1,154 @@
+"""Content-hashed names for stylesheets, scripts, images and fonts.
+
+Every fingerprinted static file is also published as
+``<stem>.<hash><suffix>`` (e.g. ``static/css/style.3f2a1b4c5d.css``), and
+pages link to that name, so it can be cached forever. References between
+stylesheets (``@import``, ``url()``) are rewritten too, which means a
+stylesheet's hash covers the files it pulls in.
+"""
+
+import hashlib
+import json
+import os
+import posixpath
+import re
+import urllib.parse
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from webcore.publish import publish_file
+
+FINGERPRINT_SUFFIXES = {
+    ".css",
+    ".js",
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".gif",
+    ".svg",
+    ".webp",
+    ".avif",
+    ".ico",
+    ".woff",
+    ".woff2",
+}
+
+HASH_LENGTH = 10
+
+# Matches the names produced by fingerprint_name().
+FINGERPRINTED = re.compile(rf"\.[0-9a-f]{{{HASH_LENGTH}}}\.[A-Za-z0-9]+$")
+
+CSS_REFERENCES = [
+    re.compile(r"""(url\(\s*)(['"]?)([^'")\s]+)\2""", re.IGNORECASE),
+    re.compile(r"""(@import\s+)(['"])([^'"]+)\2""", re.IGNORECASE),
+]
+HTML_REFERENCE = re.compile(r"""\b(src|href)=(["'])(/static/[^"']+)\2""")
+
+ASSET_MANIFEST = "static/assets.json"
+
+
+def fingerprint_name(name: str, digest: str) -> str:
+    stem, suffix = posixpath.splitext(name)
+    return f"{stem}.{digest[:HASH_LENGTH]}{suffix}"
+
+
+def is_fingerprintable(name: str) -> bool:
+    return posixpath.splitext(name)[1].lower() in FINGERPRINT_SUFFIXES
+
+
+class AssetMap:
+    """Fingerprint the static files of a site and rewrite references to them.
+
+    Hashes are taken from the sources (with stylesheet references already
+    rewritten), so the map is complete before any page is rendered.
+
+    Args:
+        searchpath (Path): Site source directory.
+        static_names (list): Static file names relative to ``searchpath``.
+        manifest (BuildManifest): Manifest of the current build, used to hash
+            files and to record the fingerprinted outputs.
+    """
+
+    def __init__(self, searchpath: Path, static_names: Iterable[str], manifest):
+        self.searchpath = Path(searchpath)
+        self.manifest = manifest
+        self.names = {n for n in static_names if is_fingerprintable(n)}
+        self.hashed: Dict[str, str] = {}
+        self.stylesheets: Dict[str, str] = {}
+        for name in sorted(self.names):
+            self._fingerprint(name, ())
+
+    def _fingerprint(self, name: str, stack) -> Optional[str]:
+        if name in self.hashed:
+            return self.hashed[name]
+        if name not in self.names or name in stack:
+            return None
+        source = self.searchpath / name
+        if name.endswith(".css"):
+            text = source.read_text(encoding="utf-8")
+            for pattern in CSS_REFERENCES:
+                text = pattern.sub(
+                    lambda m: self._rewrite_css(m, name, stack + (name,)), text
+                )
+            self.stylesheets[name] = text
+            digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        else:
+            digest = self.manifest.file_digest(source)
+        self.hashed[name] = fingerprint_name(name, digest)
+        return self.hashed[name]
+
+    def _rewrite_css(self, match: re.Match, css_name: str, stack) -> str:
+        prefix, quote, url = match.groups()
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme or parts.netloc or not parts.path:
+            return match.group(0)
+        if parts.path.startswith("/"):
+            target = parts.path.lstrip("/")
+        else:
+            target = posixpath.normpath(
+                posixpath.join(posixpath.dirname(css_name), parts.path)
+            )
+        hashed = self._fingerprint(urllib.parse.unquote(target), stack)
+        if hashed is None:
+            return match.group(0)
+        url = urllib.parse.urlunsplit(parts._replace(path="/" + urllib.parse.quote(hashed)))
+        return f"{prefix}{quote}{url}{quote}"
+
+    def url(self, url: str) -> str:
+        """Map a ``/static/...`` URL to its fingerprinted URL, if it has one."""
+        parts = urllib.parse.urlsplit(url)
+        hashed = self.hashed.get(urllib.parse.unquote(parts.path).lstrip("/"))
+        if hashed is None or parts.scheme or parts.netloc:
+            return url
+        return urllib.parse.urlunsplit(parts._replace(path="/" + urllib.parse.quote(hashed)))
+
+    def urls(self) -> Dict[str, str]:
+        """The map as ``{"/static/a.css": "/static/a.<hash>.css"}``, for templates."""
+        return {"/" + name: "/" + hashed for name, hashed in sorted(self.hashed.items())}
+
+    def rewrite_html(self, html: str) -> str:
+        """Point ``src``/``href`` attributes at fingerprinted URLs."""
+        return HTML_REFERENCE.sub(
+            lambda m: f"{m.group(1)}={m.group(2)}{self.url(m.group(3))}{m.group(2)}", html
+        )
+
+    def publish(self, outpath: Path, mode: str = "auto") -> None:
+        """Write the fingerprinted files and ``ASSET_MANIFEST`` into ``outpath``."""
+        outpath = Path(outpath)
+        for name, hashed in sorted(self.hashed.items()):
+            if self.manifest.is_fresh(outpath, hashed, hashed):
+                continue
+            target = outpath / hashed
+            if name in self.stylesheets:
+                os.makedirs(target.parent, exist_ok=True)
+                target.write_text(self.stylesheets[name], encoding="utf-8")
+            else:
+                publish_file(self.searchpath / name, target, mode)
+            self.manifest.record(hashed, hashed)
+
+        data = json.dumps(dict(sorted(self.hashed.items())), indent=2) + "\n"
+        key = hashlib.sha256(data.encode("utf-8")).hexdigest()
+        if not self.manifest.is_fresh(outpath, ASSET_MANIFEST, key):
+            (outpath / ASSET_MANIFEST).parent.mkdir(parents=True, exist_ok=True)
+            (outpath / ASSET_MANIFEST).write_text(data, encoding="utf-8")
+            self.manifest.record(ASSET_MANIFEST, key)
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import Optional
+
+
+def source_digest(*paths) -> str:
+    """Hash the source files of the code whose output is cached.
+
+    Part of cache keys, so editing that code doesn't leave stale entries
+    looking fresh.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(Path(path).read_bytes())
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """Size-bounded on-disk cache of rendered HTML.
+
+    Entries live at ``<directory>/<key[:2]>/<key>.html``. Reads bump the
+    entry's mtime, so :meth:`evict` can drop the least recently used entries
+    first. The object only holds the directory and size limit, so it can be
+    handed to worker processes.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = 64 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def __eq__(self, other):
+        if not isinstance(other, RenderCache):
+            return NotImplemented
+        return (self.directory, self.max_bytes) == (other.directory, other.max_bytes)
+
+    def __hash__(self):
+        return hash((self.directory, self.max_bytes))
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.html"
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                html = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return html
+
+    def put(self, key: str, html: str) -> None:
+        path = self._path(key)
+        os.makedirs(path.parent, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(html)
+        os.replace(tmp, path)
+
+    def evict(self) -> int:
+        """Delete least recently used entries until the cache fits ``max_bytes``.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        entries = []
+        total = 0
+        for path in self.directory.glob("*/*.html"):
+            st = path.stat()
+            entries.append((st.st_mtime_ns, st.st_size, path))
+            total += st.st_size
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
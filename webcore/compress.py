@@ -0,0 +1,133 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+try:
+    import brotli  # type: ignore[import]
+except ImportError:
+    brotli = None
+
+# Non-text types that are still worth compressing.
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+}
+
+ENCODINGS = {"gzip": ".gz", "br": ".br"}
+
+# Bumped whenever the compression settings change, so outputs get redone.
+COMPRESS_VERSION = 1
+
+
+def is_compressible(ctype: str) -> bool:
+    ctype = ctype.split(";", 1)[0]
+    return ctype.startswith("text/") or ctype in COMPRESSIBLE_TYPES
+
+
+def available_encodings() -> List[str]:
+    return ["gzip", "br"] if brotli is not None else ["gzip"]
+
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+@dataclass
+class CompressStats:
+    files: int = 0
+    unchanged: int = 0
+    original_bytes: int = 0
+    compressed_bytes: int = 0
+
+    def summary(self) -> str:
+        saved = self.original_bytes - self.compressed_bytes
+        return (
+            f"Precompressed {self.files} files "
+            f"({self.original_bytes / 1024:.0f} KiB -> "
+            f"{self.compressed_bytes / 1024:.0f} KiB, saved {saved / 1024:.0f} KiB), "
+            f"{self.unchanged} unchanged"
+        )
+
+
+def _write_compressed(target: Path, data: bytes, encoding: str):
+    body = compress_bytes(data, encoding)
+    if len(body) >= len(data):
+        return None
+    tmp = target.with_name(f"{target.name}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(body)
+    os.replace(tmp, target)
+    return len(body)
+
+
+def precompress(outpath: Path, manifest, jobs: int = 1, min_size: int = 1024) -> CompressStats:
+    """Write ``.gz`` (and ``.br``) siblings next to compressible outputs.
+
+    Every output recorded in ``manifest`` for this build is considered. A
+    sibling is keyed by the hash of the file it was made from, so unchanged
+    outputs aren't compressed again. Siblings that wouldn't be smaller than
+    the original aren't written, and siblings whose original is gone are
+    left for :meth:`BuildManifest.prune` to delete.
+
+    Args:
+        outpath (Path): The output directory.
+        manifest (BuildManifest): Manifest of the build being finished.
+        jobs (int): Number of files compressed at once.
+        min_size (int): Files smaller than this are left alone.
+
+    Returns:
+        CompressStats: Totals for the files compressed in this build.
+    """
+    suffixes = set(ENCODINGS.values())
+    for name in list(manifest.outputs):
+        base, suffix = os.path.splitext(name)
+        if suffix in suffixes and base in manifest.previous and base not in manifest.outputs:
+            del manifest.outputs[name]
+
+    stats = CompressStats()
+    tasks = []
+    for name in sorted(manifest.outputs):
+        if os.path.splitext(name)[1] in suffixes:
+            continue
+        ctype, _ = mimetypes.guess_type(name)
+        if ctype is None or not is_compressible(ctype):
+            continue
+        source = outpath / name
+        try:
+            if source.stat().st_size < min_size:
+                continue
+            data = source.read_bytes()
+        except OSError:
+            continue
+        digest = hashlib.sha256(data).hexdigest()
+        for encoding in available_encodings():
+            sibling = name + ENCODINGS[encoding]
+            key = f"{COMPRESS_VERSION}:{encoding}:{digest}"
+            if manifest.is_fresh(outpath, sibling, key):
+                stats.unchanged += 1
+                continue
+            tasks.append((sibling, key, data, encoding))
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = [
+            (sibling, key, len(data), pool.submit(_write_compressed, outpath / sibling, data, encoding))
+            for sibling, key, data, encoding in tasks
+        ]
+        for sibling, key, size, future in futures:
+            compressed = future.result()
+            if compressed is None:
+                continue
+            manifest.record(sibling, key)
+            stats.files += 1
+            stats.original_bytes += size
+            stats.compressed_bytes += compressed
+    return stats
@@ -0,0 +1,305 @@
+"""Inline the CSS each page uses and load the rest without blocking rendering.
+
+For every local ``<link rel="stylesheet">`` in a page, the stylesheet and
+everything it ``@import``s is flattened, and only the rules whose selectors
+could match something in the page are kept and inlined in its place. The
+full stylesheet is still loaded, as a preload that turns into a stylesheet
+once it arrives, for content added by scripts (e.g. search results).
+Stylesheets linked with a ``data-defer`` attribute are loaded that way too,
+without inlining anything.
+
+Matching is deliberately loose: pseudo-classes, pseudo-elements and
+attribute selectors are ignored, and combinators only require every part of
+the selector to appear somewhere in the page. That keeps every rule that
+could apply and drops the ones that can't, like ``.codehilite`` rules on
+pages without code.
+"""
+
+import os
+import re
+import urllib.parse
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+COMMENT = re.compile(r"/\*.*?\*/", re.S)
+IMPORT = re.compile(r"""@import\s+(?:url\(\s*)?(['"]?)([^'")\s;]+)\1\s*\)?\s*;""", re.I)
+RELATIVE_URL = re.compile(r"""(url\(\s*)(['"]?)([^'")\s]+)\2""", re.I)
+
+STYLESHEET_LINK = re.compile(r"<link\b[^>]*\srel=[\"']stylesheet[\"'][^>]*>", re.I)
+HREF = re.compile(r"""\bhref=(["'])([^"']+)\1""")
+SCRIPT = re.compile(r"<script\b[^>]*>", re.I)
+HEAD_END = re.compile(r"</head>", re.I)
+NOSCRIPT = re.compile(r"<noscript>.*?</noscript>", re.I | re.S)
+
+# Blocks whose rules are filtered one by one; other at-rules are kept whole.
+GROUPING_RULES = ("@media", "@supports", "@layer", "@container")
+
+PSEUDO = re.compile(r"::?[\w-]+(\((?:[^()]|\([^()]*\))*\))?")
+ATTRIBUTE = re.compile(r"\[[^\]]*\]")
+COMBINATOR = re.compile(r"\s*[>+~]\s*|\s+")
+SIMPLE = re.compile(r"[.#]?(?:\\.|[\w-])+|\*")
+
+
+class PageTokens(HTMLParser):
+    """The tag names, classes and ids that occur in a page."""
+
+    def __init__(self, html: str):
+        super().__init__(convert_charrefs=True)
+        self.tags: Set[str] = set()
+        self.classes: Set[str] = set()
+        self.ids: Set[str] = set()
+        self.feed(html)
+        self.close()
+
+    def handle_starttag(self, tag, attrs):
+        self.tags.add(tag)
+        for name, value in attrs:
+            if name == "class" and value:
+                self.classes.update(value.split())
+            elif name == "id" and value:
+                self.ids.add(value)
+
+    handle_startendtag = handle_starttag
+
+
+def selector_matches(selector: str, page: PageTokens) -> bool:
+    """Whether ``selector`` could match something in ``page``."""
+    selector = ATTRIBUTE.sub("", PSEUDO.sub("", selector)).strip()
+    for compound in COMBINATOR.split(selector):
+        for token in SIMPLE.findall(compound):
+            name = token.replace("\\", "")
+            if token == "*":
+                continue
+            if token[0] == ".":
+                found = name[1:] in page.classes
+            elif token[0] == "#":
+                found = name[1:] in page.ids
+            else:
+                found = name.lower() in page.tags
+            if not found:
+                return False
+    return True
+
+
+def _block_end(css: str, start: int) -> int:
+    """Index of the brace closing the block opened at ``start``."""
+    depth = 0
+    quote = None
+    for i in range(start, len(css)):
+        c = css[i]
+        if quote:
+            if c == quote and css[i - 1] != "\\":
+                quote = None
+        elif c in "'\"":
+            quote = c
+        elif c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return i
+    return len(css)
+
+
+def parse(css: str) -> list:
+    """Split a stylesheet into rules.
+
+    Returns:
+        list: ``("rule", selectors, body)``, ``("group", prelude, rules)``
+        for ``@media`` and the like, and ``("raw", text)`` for everything
+        else.
+    """
+    items = []
+    i = 0
+    while i < len(css):
+        brace = css.find("{", i)
+        semicolon = css.find(";", i)
+        if brace == -1 and semicolon == -1:
+            break
+        if semicolon != -1 and (brace == -1 or semicolon < brace):
+            # Only at-rules like @charset end in a semicolon at the top level.
+            items.append(("raw", css[i : semicolon + 1].strip()))
+            i = semicolon + 1
+            continue
+        prelude = css[i:brace].strip()
+        end = _block_end(css, brace)
+        body = css[brace + 1 : end]
+        if prelude.lower().startswith(GROUPING_RULES):
+            items.append(("group", prelude, parse(body)))
+        elif prelude.startswith("@"):
+            items.append(("raw", " ".join(f"{prelude}{{{body}}}".split())))
+        else:
+            items.append(("rule", prelude, body))
+        i = end + 1
+    return items
+
+
+def prune(items: list, page: PageTokens) -> str:
+    """Serialize the rules of ``items`` that could apply to ``page``."""
+    out = []
+    for item in items:
+        if item[0] == "raw":
+            out.append(item[1])
+        elif item[0] == "group":
+            inner = prune(item[2], page)
+            if inner:
+                out.append(f"{item[1]}{{{inner}}}")
+        else:
+            selectors = [s.strip() for s in item[1].split(",")]
+            used = [s for s in selectors if selector_matches(s, page)]
+            if used:
+                body = " ".join(item[2].split())
+                out.append(f"{','.join(used)}{{{body}}}")
+    return "".join(out)
+
+
+def flatten(url: str, stylesheets: Dict[str, str], stack=()) -> Optional[str]:
+    """The stylesheet at ``url`` with its local ``@import``s inlined.
+
+    Relative ``url()``s are made absolute, since the result ends up in pages
+    at other paths.
+    """
+    css = stylesheets.get(url)
+    if css is None or url in stack:
+        return None
+    base = url
+
+    def absolute(m):
+        prefix, quote, target = m.groups()
+        if target.startswith(("data:", "#")):
+            return m.group(0)
+        return f"{prefix}{quote}{urllib.parse.urljoin(base, target)}{quote}"
+
+    def inline(m):
+        target = urllib.parse.urljoin(base, m.group(2))
+        imported = flatten(target, stylesheets, stack + (url,))
+        return m.group(0) if imported is None else imported
+
+    css = COMMENT.sub("", css)
+    css = RELATIVE_URL.sub(absolute, css)
+    return IMPORT.sub(inline, css)
+
+
+def preload(href: str) -> str:
+    return (
+        f'<link rel="preload" href="{href}" as="style" '
+        "onload=\"this.onload=null;this.rel='stylesheet'\">"
+        f'<noscript><link rel="stylesheet" href="{href}"></noscript>'
+    )
+
+
+def blocking_requests(html: str, stylesheets: Dict[str, str]) -> int:
+    """Render-blocking requests in a page's ``<head>``.
+
+    Counts stylesheets, the local ones' ``@import``s, and scripts that are
+    neither ``async``, ``defer`` nor modules.
+    """
+    head = NOSCRIPT.sub("", HEAD_END.split(html, 1)[0])
+    count = 0
+    for link in STYLESHEET_LINK.findall(head):
+        count += 1
+        href = HREF.search(link)
+        if href is not None and href.group(2) in stylesheets:
+            count += len(IMPORT.findall(COMMENT.sub("", stylesheets[href.group(2)])))
+    for script in SCRIPT.findall(head):
+        if "src=" in script and not re.search(r"\b(async|defer)\b|type=[\"']module", script):
+            count += 1
+    return count
+
+
+@dataclass
+class CriticalStats:
+    pages: int = 0
+    blocking_bytes: int = 0
+    inlined_bytes: int = 0
+    blocking_before: int = 0
+    blocking_after: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"Critical CSS: {self.pages} pages, render-blocking CSS "
+            f"{self.blocking_bytes / 1024:.1f} KiB -> {self.inlined_bytes / 1024:.1f} KiB "
+            f"inlined, render-blocking requests {self.blocking_before} -> "
+            f"{self.blocking_after}"
+        )
+
+
+class CriticalCSS:
+    """Inlines per-page critical CSS.
+
+    Args:
+        stylesheets (dict): Text of every local stylesheet, by the URL pages
+            link to it with.
+    """
+
+    def __init__(self, stylesheets: Dict[str, str]):
+        self.stylesheets = stylesheets
+        self.parsed: Dict[str, list] = {}
+        self.sizes: Dict[str, int] = {}
+        self.stats = CriticalStats()
+
+    def _rules(self, url: str) -> Optional[list]:
+        if url not in self.parsed:
+            css = flatten(url, self.stylesheets)
+            if css is None:
+                return None
+            self.parsed[url] = parse(css)
+            self.sizes[url] = len(css.encode("utf-8"))
+        return self.parsed[url]
+
+    def rewrite(self, html: str) -> str:
+        page = PageTokens(html)
+        stats = self.stats
+        stats.pages += 1
+        stats.blocking_before += blocking_requests(html, self.stylesheets)
+
+        def replace(m):
+            link = m.group(0)
+            href = HREF.search(link)
+            if href is None:
+                return link
+            url = href.group(2)
+            if "data-defer" in link:
+                return preload(url)
+            rules = self._rules(url)
+            if rules is None:
+                return link
+            # "</style" anywhere in the CSS would end the inline block early;
+            # "<\/" means the same to CSS and nothing to the HTML parser.
+            css = prune(rules, page).replace("</", "<\\/")
+            stats.blocking_bytes += self.sizes[url]
+            stats.inlined_bytes += len(css.encode("utf-8"))
+            return f"<style>{css}</style>{preload(url)}"
+
+        head, sep, body = html.partition("</head>")
+        if not sep:
+            return html
+        html = STYLESHEET_LINK.sub(replace, head) + sep + body
+        stats.blocking_after += blocking_requests(html, self.stylesheets)
+        return html
+
+    def process(self, outpath: Path, outputs: Iterable[str]) -> List[str]:
+        """Rewrite the HTML files among ``outputs``.
+
+        Each file is replaced rather than written to, so an output hard-linked
+        to its source (see :func:`webcore.publish.publish_file`) can't change
+        the source; still, only rendered pages should be passed in.
+
+        Returns:
+            list: The files rewritten, relative to ``outpath``.
+        """
+        rewritten = []
+        for output in outputs:
+            if not output.endswith(".html"):
+                continue
+            path = Path(outpath) / output
+            html = path.read_text(encoding="utf-8")
+            new = self.rewrite(html)
+            if new != html:
+                tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                tmp.write_text(new, encoding="utf-8")
+                os.replace(tmp, path)
+                rewritten.append(output)
+        return rewritten
@@ -0,0 +1,233 @@
+"""Atom and JSON feeds, ``sitemap.xml`` and ``robots.txt`` for the site.
+
+All of them are made from the post list of a build. Every date in them comes
+from the posts themselves (their frontmatter ``date``, or the last commit
+that touched them, whichever is later), never from the time of the build,
+so rebuilding unchanged posts produces byte-identical files. Those aren't
+rewritten, which keeps their mtime, and so the validators feed readers and
+crawlers send with conditional requests keep matching.
+"""
+
+import hashlib
+import json
+import subprocess
+import xml.etree.ElementTree as ET
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+TITLE = "N3rdL0rd's writeups"
+AUTHOR = "N3rdL0rd"
+
+ATOM_FEED = "feed.xml"
+JSON_FEED = "feed.json"
+SITEMAP = "sitemap.xml"
+ROBOTS = "robots.txt"
+
+# Only the newest posts go into the feeds; readers keep what they've seen.
+FEED_ENTRIES = 20
+
+ATOM_NS = "http://www.w3.org/2005/Atom"
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+XML_BASE = "{http://www.w3.org/XML/1998/namespace}base"
+
+
+def site_url(cname: Path = Path("CNAME")) -> Optional[str]:
+    """The site's absolute base URL, from the domain in the ``CNAME`` file."""
+    try:
+        host = cname.read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    return f"https://{host}" if host else None
+
+
+def git_history(posts_dir: str = "src/posts") -> Dict[str, datetime]:
+    """When each post was last committed, by file stem, from a single ``git log``.
+
+    Empty in a shallow clone, where every post would look as if it changed in
+    the newest commit; the frontmatter dates are used instead.
+    """
+    try:
+        shallow = subprocess.check_output(
+            ["git", "rev-parse", "--is-shallow-repository"],
+            text=True,
+            stderr=subprocess.DEVNULL,
+        )
+        if shallow.strip() != "false":
+            return {}
+        out = subprocess.check_output(
+            ["git", "log", "--format=%x00%cI", "--name-only", "--", posts_dir],
+            text=True,
+            stderr=subprocess.DEVNULL,
+        )
+    except (subprocess.CalledProcessError, OSError):
+        return {}
+    history: Dict[str, datetime] = {}
+    for commit in out.split("\0")[1:]:
+        lines = commit.strip().splitlines()
+        if not lines:
+            continue
+        when = datetime.fromisoformat(lines[0])
+        for name in lines[1:]:
+            path = Path(name)
+            if path.suffix == ".md":
+                # Newest commits come first.
+                history.setdefault(path.stem, when)
+    return history
+
+
+def as_datetime(value) -> datetime:
+    """A post's frontmatter date (a string or a date) as midnight UTC."""
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if not isinstance(value, date):
+        value = date.fromisoformat(str(value)[:10])
+    return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+
+
+def post_lastmod(posts: Iterable, history: Dict[str, datetime]) -> Dict[str, datetime]:
+    """When each post last changed, by URL."""
+    lastmod = {}
+    for post in posts:
+        published = as_datetime(post.date)
+        committed = history.get(post.url.strip("/").rsplit("/", 1)[-1])
+        lastmod[post.url] = max(published, committed) if committed else published
+    return lastmod
+
+
+def _text(parent, tag, text=None, **attrs):
+    element = ET.SubElement(parent, tag, attrs)
+    if text is not None:
+        element.text = text
+    return element
+
+
+def _xml(root) -> bytes:
+    return ET.tostring(root, encoding="utf-8", xml_declaration=True) + b"\n"
+
+
+def atom_feed(posts: List, base_url: str, lastmod: Dict[str, datetime]) -> bytes:
+    feed = ET.Element("feed", {"xmlns": ATOM_NS, XML_BASE: f"{base_url}/"})
+    _text(feed, "title", TITLE)
+    _text(feed, "id", f"{base_url}/")
+    _text(feed, "link", href=f"{base_url}/")
+    _text(feed, "link", rel="self", type="application/atom+xml", href=f"{base_url}/{ATOM_FEED}")
+    _text(feed, "updated", max(lastmod.values()).isoformat() if lastmod else None)
+    _text(_text(feed, "author"), "name", AUTHOR)
+    for post in posts:
+        entry = _text(feed, "entry")
+        _text(entry, "title", post.title)
+        _text(entry, "id", f"{base_url}{post.url}")
+        _text(entry, "link", href=f"{base_url}{post.url}")
+        _text(entry, "published", as_datetime(post.date).isoformat())
+        _text(entry, "updated", lastmod[post.url].isoformat())
+        for tag in post.tags:
+            _text(entry, "category", term=tag)
+        if post.excerpt:
+            _text(entry, "summary", post.excerpt)
+        _text(entry, "content", post.content, type="html")
+    return _xml(feed)
+
+
+def json_feed(posts: List, base_url: str, lastmod: Dict[str, datetime]) -> bytes:
+    feed = {
+        "version": "https://jsonfeed.org/version/1.1",
+        "title": TITLE,
+        "home_page_url": f"{base_url}/",
+        "feed_url": f"{base_url}/{JSON_FEED}",
+        "authors": [{"name": AUTHOR}],
+        "items": [
+            {
+                "id": f"{base_url}{post.url}",
+                "url": f"{base_url}{post.url}",
+                "title": post.title,
+                "summary": post.excerpt,
+                "content_html": post.content,
+                "date_published": as_datetime(post.date).isoformat(),
+                "date_modified": lastmod[post.url].isoformat(),
+                "tags": list(post.tags),
+            }
+            for post in posts
+        ],
+    }
+    return json.dumps(feed, indent=1, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def sitemap(urls: Dict[str, datetime], base_url: str) -> bytes:
+    urlset = ET.Element("urlset", xmlns=SITEMAP_NS)
+    for url in sorted(urls):
+        entry = _text(urlset, "url")
+        _text(entry, "loc", f"{base_url}{url}")
+        _text(entry, "lastmod", urls[url].isoformat())
+    return _xml(urlset)
+
+
+def page_urls(outputs: Iterable[str]) -> List[str]:
+    """URLs of the HTML pages among ``outputs``, except the 404 page."""
+    urls = []
+    for output in outputs:
+        if output == "404.html" or not output.endswith(".html"):
+            continue
+        if output == "index.html" or output.endswith("/index.html"):
+            output = output[: -len("index.html")]
+        urls.append(f"/{output}")
+    return urls
+
+
+def write_feeds(
+    outpath: Path,
+    posts: List,
+    pages: Iterable,
+    manifest,
+    base_url: Optional[str] = None,
+    history: Optional[Dict[str, datetime]] = None,
+) -> List[str]:
+    """Write the feeds, the sitemap and ``robots.txt`` under ``outpath``.
+
+    Args:
+        posts (list): Every post, newest first.
+        pages (list): The listing pages of the build. Each one's ``lastmod``
+            is that of the newest change among its posts; other pages that
+            aren't posts get the newest change on the whole site.
+        manifest (BuildManifest): The sitemap lists every page recorded in
+            it, so this must run after everything else is rendered.
+        base_url (str): Absolute URL of the site; read from ``CNAME`` if not
+            given. Without one nothing is written, since feeds and sitemaps
+            need absolute URLs.
+        history (dict): Last commit dates by post file stem; read from git
+            if not given.
+
+    Returns:
+        list: The files written, relative to ``outpath``.
+    """
+    base_url = base_url or site_url()
+    if base_url is None:
+        return []
+    base_url = base_url.rstrip("/")
+    lastmod = post_lastmod(posts, git_history() if history is None else history)
+    newest = max(lastmod.values(), default=datetime(1970, 1, 1, tzinfo=timezone.utc))
+
+    urls = {url: newest for url in page_urls(manifest.outputs)}
+    for page in pages:
+        changes = [lastmod[item.url] for item in page.items if item.url in lastmod]
+        urls[page.url] = max(changes, default=newest)
+    urls.update(lastmod)
+
+    recent = posts[:FEED_ENTRIES]
+    recent_lastmod = {post.url: lastmod[post.url] for post in recent}
+    files = {
+        ATOM_FEED: atom_feed(recent, base_url, recent_lastmod),
+        JSON_FEED: json_feed(recent, base_url, recent_lastmod),
+        SITEMAP: sitemap(urls, base_url),
+        ROBOTS: f"User-agent: *\nAllow: /\n\nSitemap: {base_url}/{SITEMAP}\n".encode(),
+    }
+
+    written = []
+    for output, data in files.items():
+        key = hashlib.sha256(data).hexdigest()
+        if manifest.is_fresh(outpath, output, key):
+            continue
+        manifest.record(output, key)
+        (Path(outpath) / output).write_bytes(data)
+        written.append(output)
+    return written
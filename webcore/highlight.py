@@ -0,0 +1,168 @@
+"""Memoized code highlighting for the ``codehilite`` extension.
+
+Adding :class:`HighlightExtension` to a markdown instance swaps the
+``CodeHilite`` class used by ``fenced_code`` and ``codehilite`` for
+:class:`CachedCodeHilite`, which looks each block up by its source, requested
+language and options before running Pygments, and records every block whose
+lexer had to be guessed.
+"""
+
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import pygments
+from markdown import Extension
+from markdown.extensions import codehilite, fenced_code
+from pygments import highlight
+from pygments.formatters import get_formatter_by_name
+from pygments.lexers import get_lexer_by_name, guess_lexer
+from pygments.util import ClassNotFound
+
+from webcore.cache import RenderCache, source_digest
+
+SOURCE_DIGEST = source_digest(__file__)
+
+
+@dataclass
+class GuessedBlock:
+    source: str
+    lexer: str
+    first_line: str
+
+
+@dataclass
+class HighlightStats:
+    blocks: int = 0
+    memory_hits: int = 0
+    disk_hits: int = 0
+    seconds: float = 0.0
+    guessed: List[GuessedBlock] = field(default_factory=list)
+
+    def merge(self, other: "HighlightStats") -> None:
+        self.blocks += other.blocks
+        self.memory_hits += other.memory_hits
+        self.disk_hits += other.disk_hits
+        self.seconds += other.seconds
+        self.guessed.extend(other.guessed)
+
+
+# Per-process state. Worker processes each keep their own and hand their stats
+# back with take_stats().
+_memo: Dict[str, Tuple[str, Optional[str]]] = {}
+_disk: Optional[RenderCache] = None
+_stats = HighlightStats()
+current_source = ""
+
+
+def take_stats() -> HighlightStats:
+    """Return the stats gathered so far in this process and start over."""
+    global _stats
+    stats, _stats = _stats, HighlightStats()
+    return stats
+
+
+def block_key(src: str, lang: Optional[str], guess_lang: bool, options: dict) -> str:
+    payload = json.dumps(
+        [pygments.__version__, SOURCE_DIGEST, src, lang, guess_lang, options],
+        sort_keys=True,
+        default=repr,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CachedCodeHilite(codehilite.CodeHilite):
+    def hilite(self, shebang: bool = True) -> str:
+        if not self.use_pygments or not isinstance(self.pygments_formatter, str):
+            return super().hilite(shebang)
+
+        self.src = self.src.strip('\n')
+        if self.lang is None and shebang:
+            self._parseHeader()
+
+        _stats.blocks += 1
+        key = block_key(self.src, self.lang, self.guess_lang, self.options)
+        entry = _memo.get(key)
+        if entry is not None:
+            _stats.memory_hits += 1
+        elif _disk is not None and (cached := _disk.get(key)) is not None:
+            _stats.disk_hits += 1
+            entry = _memo[key] = tuple(json.loads(cached))
+        else:
+            entry = _memo[key] = self._highlight()
+            if _disk is not None:
+                _disk.put(key, json.dumps(entry))
+
+        html, guessed = entry
+        if guessed is not None:
+            _stats.guessed.append(
+                GuessedBlock(
+                    source=current_source,
+                    lexer=guessed,
+                    first_line=self.src.split("\n", 1)[0],
+                )
+            )
+        return html
+
+    def _highlight(self) -> Tuple[str, Optional[str]]:
+        """Run Pygments on the block.
+
+        Returns:
+            tuple: The HTML, and the alias of the lexer if it had to be guessed.
+        """
+        start = time.perf_counter()
+        guessed = None
+        try:
+            lexer = get_lexer_by_name(self.lang, **self.options)
+        except ValueError:
+            try:
+                if self.guess_lang:
+                    lexer = guess_lexer(self.src, **self.options)
+                    guessed = lexer.aliases[0]
+                else:
+                    lexer = get_lexer_by_name('text', **self.options)
+            except ValueError:  # pragma: no cover
+                lexer = get_lexer_by_name('text', **self.options)
+        if not self.lang:
+            self.lang = lexer.aliases[0]
+        try:
+            formatter = get_formatter_by_name(self.pygments_formatter, **self.options)
+        except ClassNotFound:
+            formatter = get_formatter_by_name('html', **self.options)
+        html = highlight(self.src, lexer, formatter)
+        _stats.seconds += time.perf_counter() - start
+        return html, guessed
+
+
+class HighlightExtension(Extension):
+    """Route ``codehilite`` highlighting through :class:`CachedCodeHilite`.
+
+    The swap is process-wide, so only one highlight cache can be active per
+    process; the last extension instance to be loaded wins.
+    """
+
+    def __init__(self, cache: Optional[RenderCache] = None, **kwargs):
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def extendMarkdown(self, md):
+        global _disk
+        _disk = self.cache
+        codehilite.CodeHilite = CachedCodeHilite  # type: ignore[misc]
+        fenced_code.CodeHilite = CachedCodeHilite  # type: ignore[misc]
+
+
+def format_report(stats: HighlightStats, limit: int = 20) -> str:
+    lines = [
+        f"Highlighted {stats.blocks} code blocks in {stats.seconds:.3f}s "
+        f"({stats.memory_hits} memory hits, {stats.disk_hits} disk hits)",
+    ]
+    if stats.guessed:
+        lines.append(f"{len(stats.guessed)} blocks had their language guessed:")
+        for block in stats.guessed[:limit]:
+            lines.append(f"  {block.source}: {block.lexer:<12} {block.first_line[:60]}")
+        if len(stats.guessed) > limit:
+            lines.append(f"  ... and {len(stats.guessed) - limit} more")
+    return "\n".join(lines)
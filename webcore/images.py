@@ -0,0 +1,275 @@
+"""Responsive variants and ``<img>`` rewriting for images used in posts.
+
+Every local image a post links to gets ``width``/``height`` and lazy loading.
+When Pillow is installed, downscaled copies in each modern format it can
+encode (AVIF, WebP) are generated too, and the image is wrapped in a
+``<picture>`` offering them. Derived files are cached under the hash of the
+source image, so only new or edited images cost anything to build.
+"""
+
+import html
+import json
+import os
+import re
+import shutil
+import struct
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image, features  # type: ignore[import]
+except ImportError:
+    Image = None
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".gif", ".webp"}
+
+# Widths of the downscaled copies; widths above the original's are skipped.
+VARIANT_WIDTHS = (480, 960, 1600)
+
+# Formats in order of preference, with their encoder settings. The slowest
+# settings take several times as long for files only a little smaller, and
+# every image that isn't cached yet pays for them.
+VARIANT_FORMATS = {
+    "avif": {"quality": 60, "speed": 8},
+    "webp": {"quality": 80, "method": 4},
+}
+
+# Bumped whenever the settings above change, so cached variants get redone.
+IMAGES_VERSION = 3
+
+IMG_TAG = re.compile(r"<img\b([^>]*?)\s*/?>", re.IGNORECASE)
+ATTRIBUTE = re.compile(r'([\w-]+)="([^"]*)"')
+
+
+@dataclass
+class Variant:
+    path: str
+    width: int
+    format: str
+
+
+@dataclass
+class ImageInfo:
+    width: int
+    height: int
+    variants: List[Variant] = field(default_factory=list)
+    digest: str = ""
+
+
+def image_size(path: Path) -> Optional[Tuple[int, int]]:
+    """Read the dimensions of a PNG, GIF or JPEG file from its header."""
+    with open(path, "rb") as f:
+        head = f.read(32)
+        if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+            return struct.unpack(">II", head[16:24])
+        if head[:6] in (b"GIF87a", b"GIF89a"):
+            return struct.unpack("<HH", head[6:10])
+        if not head.startswith(b"\xff\xd8"):
+            return None
+        f.seek(2)
+        while True:
+            marker = f.read(4)
+            if len(marker) < 4 or marker[0] != 0xFF:
+                return None
+            length = struct.unpack(">H", marker[2:4])[0]
+            # SOF0-SOF15, except DHT, JPG and DAC.
+            if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">xHH", f.read(5))
+                return width, height
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def supported_formats() -> List[str]:
+    if Image is None:
+        return []
+    return [fmt for fmt in VARIANT_FORMATS if features.check(fmt)]
+
+
+def make_variants(source: Path, cache_dir: Path, formats: Optional[List[str]] = None) -> ImageInfo:
+    """Write the variants of ``source`` into ``cache_dir`` and describe them.
+
+    Variants that come out larger than the source file are dropped. If that
+    happens to the full-width one, the whole format is dropped, since its
+    ``srcset`` would otherwise top out below the image's size.
+    """
+    size = image_size(source)
+    if formats is None:
+        formats = supported_formats()
+    if not formats:
+        return ImageInfo(*size) if size else ImageInfo(0, 0)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    source_bytes = source.stat().st_size
+    with Image.open(source) as im:
+        info = ImageInfo(*im.size)
+        if getattr(im, "n_frames", 1) > 1:
+            return info
+        im = im.convert("RGBA" if "A" in im.getbands() or "transparency" in im.info else "RGB")
+        # Largest first, so a format that loses its full-width variant is
+        # dropped before anything smaller is encoded in it.
+        widths = [info.width] + [w for w in reversed(VARIANT_WIDTHS) if w < info.width]
+        formats = list(formats)
+        for width in widths:
+            height = max(1, round(info.height * width / info.width))
+            resized = im if width == info.width else im.resize((width, height), Image.LANCZOS)
+            for fmt in list(formats):
+                name = f"{width}.{fmt}"
+                resized.save(cache_dir / name, fmt.upper(), **VARIANT_FORMATS[fmt])
+                if (cache_dir / name).stat().st_size >= source_bytes:
+                    (cache_dir / name).unlink()
+                    if width == info.width:
+                        formats.remove(fmt)
+                    continue
+                info.variants.append(Variant(name, width, fmt))
+    info.variants.sort(key=lambda v: v.width)
+    return info
+
+
+def variant_name(static_name: str, variant: Variant, digest: str) -> str:
+    """Name a variant after its source and the source's hash, so it can be cached forever."""
+    stem, _ = os.path.splitext(static_name)
+    return f"{stem}.{variant.width}w.{digest[:10]}.{variant.format}"
+
+
+class ImagePipeline:
+    """Generate variants for the images posts use and rewrite their tags.
+
+    Args:
+        searchpath (Path): Site source directory, where ``/static/...`` URLs
+            are looked up.
+        outpath (Path): Output directory the variants are published to.
+        manifest (BuildManifest): Manifest of the current build; variants are
+            recorded in it so stale ones get pruned.
+        cache_dir (Path): Where derived images are kept between builds.
+        jobs (int): Number of images processed at once. The encoders release
+            the GIL, so at least one per CPU is used regardless.
+        variants (bool): Generate the AVIF/WebP variants. Without them, tags
+            still get their dimensions and lazy loading.
+    """
+
+    def __init__(
+        self,
+        searchpath: Path,
+        outpath: Path,
+        manifest,
+        cache_dir: Path,
+        jobs: int = 1,
+        variants: bool = True,
+    ):
+        self.searchpath = Path(searchpath)
+        self.outpath = Path(outpath)
+        self.manifest = manifest
+        self.cache_dir = Path(cache_dir)
+        self.jobs = jobs
+        self.variants = variants
+        self.images: Dict[str, ImageInfo] = {}
+
+    def static_name(self, url: str) -> Optional[str]:
+        if not url.startswith("/static/"):
+            return None
+        name = url.lstrip("/").split("?", 1)[0].split("#", 1)[0]
+        if Path(name).suffix.lower() not in IMAGE_SUFFIXES:
+            return None
+        if not (self.searchpath / name).is_file():
+            return None
+        return name
+
+    def _load(self, static_name: str) -> ImageInfo:
+        source = self.searchpath / static_name
+        digest = self.manifest.file_digest(source)
+        cache_dir = self.cache_dir / f"{digest}-{IMAGES_VERSION}"
+        index = cache_dir / "info.json"
+        formats = supported_formats() if self.variants else []
+        try:
+            with open(index, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data["formats"] == formats:
+                return ImageInfo(
+                    data["width"],
+                    data["height"],
+                    [Variant(*v) for v in data["variants"]],
+                    digest,
+                )
+        except (OSError, ValueError, KeyError):
+            pass
+
+        info = make_variants(source, cache_dir, formats)
+        info.digest = digest
+        if formats:
+            tmp = index.with_name("info.json.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "formats": formats,
+                        "width": info.width,
+                        "height": info.height,
+                        "variants": [[v.path, v.width, v.format] for v in info.variants],
+                    },
+                    f,
+                )
+            os.replace(tmp, index)
+        return info
+
+    def _publish(self, static_name: str, info: ImageInfo) -> None:
+        cache_dir = self.cache_dir / f"{info.digest}-{IMAGES_VERSION}"
+        for variant in info.variants:
+            name = variant_name(static_name, variant, info.digest)
+            key = f"{info.digest}-{IMAGES_VERSION}/{variant.path}"
+            if self.manifest.is_fresh(self.outpath, name, key):
+                continue
+            target = self.outpath / name
+            os.makedirs(target.parent, exist_ok=True)
+            shutil.copyfile(cache_dir / variant.path, target)
+            self.manifest.record(name, key)
+
+    def process(self, posts) -> None:
+        """Prepare every image the posts use and rewrite their ``content``."""
+        names = set()
+        for post in posts:
+            for match in IMG_TAG.finditer(post.content):
+                src = dict(ATTRIBUTE.findall(match.group(1))).get("src", "")
+                name = self.static_name(html.unescape(src))
+                if name is not None:
+                    names.add(name)
+
+        names = sorted(names)
+        with ThreadPoolExecutor(max_workers=max(self.jobs, os.cpu_count() or 1)) as pool:
+            infos = list(pool.map(self._load, names))
+        for name, info in zip(names, infos):
+            self.images[name] = info
+            self._publish(name, info)
+
+        for post in posts:
+            post.content = IMG_TAG.sub(self._rewrite_tag, post.content)
+
+    def _rewrite_tag(self, match: re.Match) -> str:
+        attrs = dict(ATTRIBUTE.findall(match.group(1)))
+        name = self.static_name(html.unescape(attrs.get("src", "")))
+        info = self.images.get(name) if name else None
+        if info is None or not info.width:
+            return match.group(0)
+
+        attrs.setdefault("width", str(info.width))
+        attrs.setdefault("height", str(info.height))
+        attrs.setdefault("loading", "lazy")
+        attrs.setdefault("decoding", "async")
+        img = "<img " + " ".join(f'{k}="{v}"' for k, v in attrs.items()) + " />"
+        if not info.variants:
+            return img
+
+        sizes = f"(max-width: {info.width}px) 100vw, {info.width}px"
+        sources = []
+        for fmt in VARIANT_FORMATS:
+            srcset = ", ".join(
+                f"/{urllib.parse.quote(variant_name(name, v, info.digest))} {v.width}w"
+                for v in info.variants
+                if v.format == fmt
+            )
+            if srcset:
+                sources.append(
+                    f'<source type="image/{fmt}" srcset="{srcset}" sizes="{sizes}" />'
+                )
+        return "<picture>" + "".join(sources) + img + "</picture>"
@@ -0,0 +1,74 @@
+// Injected by the development server (build.py --serve). Listens for rebuild
+// notifications and reloads the page only when something it uses changed.
+(function () {
+    "use strict";
+
+    // "/posts/foo/" -> "posts/foo/index.html", matching the build outputs.
+    function outputFor(pathname) {
+        var path = decodeURIComponent(pathname).replace(/^\/+/, "");
+        if (path === "" || path.endsWith("/")) {
+            path += "index.html";
+        } else if (!/\.[^/]+$/.test(path)) {
+            path += "/index.html";
+        }
+        return path;
+    }
+
+    function isStylesheet(path) {
+        return /^static\/.*\.css$/.test(path);
+    }
+
+    function refreshStylesheets() {
+        var stamp = Date.now();
+        document.querySelectorAll('link[rel="stylesheet"]').forEach(function (link) {
+            var url = new URL(link.href, location.href);
+            if (url.origin !== location.origin) {
+                return;
+            }
+            url.searchParams.set("livereload", stamp);
+            // Swap in a new <link> and drop the old one once it has loaded, so
+            // the page never renders unstyled.
+            var next = link.cloneNode();
+            next.href = url.href;
+            next.addEventListener("load", function () { link.remove(); });
+            next.addEventListener("error", function () { link.remove(); });
+            link.after(next);
+        });
+    }
+
+    function usesAsset(path) {
+        var url = "/" + path;
+        return Array.prototype.some.call(
+            document.querySelectorAll("[src], [href]"),
+            function (el) {
+                var ref = el.getAttribute("src") || el.getAttribute("href");
+                try {
+                    return decodeURIComponent(new URL(ref, location.href).pathname) === url;
+                } catch (e) {
+                    return false;
+                }
+            }
+        );
+    }
+
+    var page = outputFor(location.pathname);
+    var source = new EventSource("/__livereload");
+
+    source.addEventListener("rebuild", function (event) {
+        var changed = JSON.parse(event.data).changed;
+        var stylesheets = false;
+        for (var i = 0; i < changed.length; i++) {
+            var path = changed[i];
+            if (path === page || (!isStylesheet(path) && usesAsset(path))) {
+                location.reload();
+                return;
+            }
+            if (isStylesheet(path)) {
+                stylesheets = true;
+            }
+        }
+        if (stylesheets) {
+            refreshStylesheets();
+        }
+    });
+})();
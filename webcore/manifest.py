@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+from dataclasses import fields, is_dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from jinja2 import Environment, meta, nodes
+
+MANIFEST_VERSION = 1
+
+
+def hash_bytes(*parts: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def digest_value(value: Any) -> bytes:
+    """Serialize a template context value into stable bytes for hashing.
+
+    Dataclasses are reduced to their fields, except fields marked with
+    ``metadata={"digest": False}`` (e.g. the rendered body of a post, which
+    listing templates never look at).
+    """
+
+    def reduce(obj):
+        if is_dataclass(obj) and not isinstance(obj, type):
+            return {
+                f.name: reduce(getattr(obj, f.name))
+                for f in fields(obj)
+                if f.metadata.get("digest", True)
+            }
+        if isinstance(obj, dict):
+            return {str(k): reduce(v) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return [reduce(v) for v in obj]
+        if isinstance(obj, (str, int, float, bool)) or obj is None:
+            return obj
+        return str(obj)
+
+    return json.dumps(reduce(value), sort_keys=True).encode("utf-8")
+
+
+def template_closure(env: Environment, name: str) -> List[str]:
+    """Return ``name`` and every template it extends, includes or imports.
+
+    Args:
+        env (Environment): The Jinja environment used to load templates.
+        name (str): Name of the root template.
+
+    Returns:
+        list: Template names in discovery order, ``name`` first.
+    """
+    seen: List[str] = []
+    pending = [name]
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.append(current)
+        source, _, _ = env.loader.get_source(env, current)  # type: ignore[union-attr]
+        for ref in meta.find_referenced_templates(env.parse(source)):
+            if ref is not None:
+                pending.append(ref)
+    return seen
+
+
+def template_digest(env: Environment, name: str, context: Dict[str, Any]) -> str:
+    """Hash a template, its dependency graph and the context it reads.
+
+    Only the context variables that the templates in the closure actually
+    reference are hashed, so e.g. the commit hash in the globals doesn't
+    invalidate pages that never print it. Every name a template loads counts,
+    including loop variables; ``meta.find_undeclared_variables`` can't be
+    used, since it skips the blocks of templates that extend another.
+    """
+    parts = []
+    used = set()
+    for dep in template_closure(env, name):
+        source, _, _ = env.loader.get_source(env, dep)  # type: ignore[union-attr]
+        parts.append(dep.encode("utf-8"))
+        parts.append(source.encode("utf-8"))
+        used |= {
+            node.name
+            for node in env.parse(source).find_all(nodes.Name)
+            if node.ctx == "load"
+        }
+    for var in sorted(used):
+        if var in context:
+            parts.append(var.encode("utf-8"))
+            parts.append(digest_value(context[var]))
+    return hash_bytes(*parts)
+
+
+def generator_digest(sources: Iterable[Path], options: Dict[str, Any]) -> str:
+    """Hash the code that builds the site and the options that change its output."""
+    parts = [json.dumps(options, sort_keys=True).encode()]
+    for path in sources:
+        parts.append(Path(path).as_posix().encode())
+        parts.append(Path(path).read_bytes())
+    return hash_bytes(*parts)
+
+
+class BuildManifest:
+    """Persistent record of which inputs produced each file in the output tree.
+
+    Outputs are keyed by their path relative to the output directory and map
+    to a digest of everything that went into them. A build asks
+    :meth:`is_fresh` before writing an output and :meth:`record` afterwards;
+    :meth:`prune` then deletes outputs from the previous build that weren't
+    produced this time.
+
+    ``generator`` identifies the code and options of the build (see
+    :func:`generator_digest`). A manifest saved by a different generator is
+    :attr:`invalidated`: none of its outputs are fresh, but they're still
+    known, so the ones no longer produced get pruned.
+    """
+
+    def __init__(
+        self, path: Optional[Path] = None, data: Optional[dict] = None, generator: str = ""
+    ):
+        self.path = path
+        self.generator = generator
+        self.invalidated = False
+        data = data or {}
+        self.previous: Dict[str, str] = data.get("outputs", {})
+        self.previous_files: Dict[str, list] = data.get("files", {})
+        self.file_hashes: Dict[str, list] = {}
+        self.outputs: Dict[str, str] = {}
+        self.written: List[str] = []
+
+    @classmethod
+    def load(cls, path: Path, generator: str = "") -> "BuildManifest":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls(path, generator=generator)
+        if data.get("version") != MANIFEST_VERSION:
+            return cls(path, generator=generator)
+        if data.get("generator", "") != generator:
+            # No key is empty, so nothing is fresh.
+            outputs = {output: "" for output in data.get("outputs", {})}
+            manifest = cls(path, dict(data, outputs=outputs), generator)
+            manifest.invalidated = True
+            return manifest
+        return cls(path, data, generator)
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        os.makedirs(self.path.parent, exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "generator": self.generator,
+            "outputs": self.outputs,
+            "files": self.file_hashes,
+        }
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def file_digest(self, path: Path) -> str:
+        """Hash a file, reusing the previous hash if its size and mtime match."""
+        st = path.stat()
+        key = path.as_posix()
+        cached = self.previous_files.get(key)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            self.file_hashes[key] = cached
+            return cached[2]
+        with open(path, "rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+        self.file_hashes[key] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def is_fresh(self, outpath: Path, output: str, key: str) -> bool:
+        """Check whether ``output`` was already built from inputs hashing to ``key``.
+
+        A fresh output is recorded for this build as a side effect.
+        """
+        if self.previous.get(output) != key:
+            return False
+        if not (outpath / output).is_file():
+            return False
+        self.outputs[output] = key
+        return True
+
+    def record(self, output: str, key: str) -> None:
+        self.outputs[output] = key
+        self.written.append(output)
+
+    def carry_over(self, exclude=()) -> None:
+        """Keep every output and file hash of the previous build, except ``exclude``.
+
+        Used for partial rebuilds that only look at a few inputs; anything in
+        ``exclude`` that isn't recorded again gets pruned.
+        """
+        exclude = set(exclude)
+        for output, key in self.previous.items():
+            if output not in exclude:
+                self.outputs.setdefault(output, key)
+        for path, entry in self.previous_files.items():
+            self.file_hashes.setdefault(path, entry)
+
+    def prune(self, outpath: Path) -> List[str]:
+        """Delete outputs of the previous build that weren't produced this time.
+
+        Returns:
+            list: The removed output paths, relative to ``outpath``.
+        """
+        removed = []
+        for output in sorted(set(self.previous) - set(self.outputs)):
+            target = outpath / output
+            try:
+                target.unlink()
+            except FileNotFoundError:
+                pass
+            removed.append(output)
+            parent = target.parent
+            while parent != outpath and parent.is_dir() and not any(parent.iterdir()):
+                parent.rmdir()
+                parent = parent.parent
+        return removed
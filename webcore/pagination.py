@@ -0,0 +1,60 @@
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+
+@dataclass
+class Page:
+    """One page of a paginated listing.
+
+    Attributes:
+        number (int): 1-based page number.
+        count (int): Total number of pages.
+        items (list): The items on this page.
+        url (str): URL of this page; the first page lives at the listing's
+            base URL and the others at ``<base>page/<n>/``.
+        prev_url (str): URL of the previous page, or None on the first.
+        next_url (str): URL of the next page, or None on the last.
+    """
+
+    number: int
+    count: int
+    items: list
+    url: str
+    prev_url: Optional[str] = None
+    next_url: Optional[str] = None
+
+    @property
+    def output(self) -> str:
+        """Path of the page's ``index.html``, relative to the output directory."""
+        return f"{self.url.strip('/')}/index.html"
+
+
+def page_url(base_url: str, number: int) -> str:
+    return base_url if number == 1 else f"{base_url}page/{number}/"
+
+
+def paginate(items: Sequence, base_url: str, per_page: int = 0) -> List[Page]:
+    """Split ``items`` into pages of ``per_page`` (all on one page if 0).
+
+    Args:
+        items (list): The items, in listing order.
+        base_url (str): URL of the first page, ending in ``/``.
+        per_page (int): Items per page.
+
+    Returns:
+        list: At least one page, even if ``items`` is empty.
+    """
+    per_page = per_page if per_page > 0 else max(1, len(items))
+    chunks = [items[i : i + per_page] for i in range(0, len(items), per_page)] or [[]]
+    count = len(chunks)
+    return [
+        Page(
+            number=n,
+            count=count,
+            items=list(chunk),
+            url=page_url(base_url, n),
+            prev_url=page_url(base_url, n - 1) if n > 1 else None,
+            next_url=page_url(base_url, n + 1) if n < count else None,
+        )
+        for n, chunk in enumerate(chunks, start=1)
+    ]
@@ -0,0 +1,261 @@
+import copy
+import hashlib
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from functools import lru_cache, partial
+from importlib import metadata
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import frontmatter
+import markdown
+
+from webcore import highlight, tex
+from webcore.cache import RenderCache, source_digest
+
+
+@dataclass(slots=True, frozen=True)
+class PostSummary:
+    """What listings show of a post, without its rendered body."""
+
+    title: str
+    date: date
+    excerpt: str
+    url: str
+    tags: Tuple[str, ...]
+
+
+@dataclass
+class Post:
+    title: str
+    date: date
+    excerpt: str
+    url: str
+    content: str = field(metadata={"digest": False})
+    tags: List[str]
+
+    def summary(self) -> PostSummary:
+        return PostSummary(
+            title=self.title,
+            date=self.date,
+            excerpt=self.excerpt,
+            url=self.url,
+            tags=tuple(self.tags),
+        )
+
+    @property
+    def needs_math_runtime(self) -> bool:
+        """Whether some of the post's math is left for MathJax to typeset."""
+        return tex.needs_runtime(self.content)
+
+
+@dataclass(frozen=True)
+class RenderOptions:
+    """How post bodies are rendered; passed as-is to worker processes.
+
+    Attributes:
+        cache (RenderCache): Cache of whole rendered post bodies.
+        highlight_cache (RenderCache): Cache of individual highlighted code
+            blocks, shared across posts and builds.
+        math_cache (RenderCache): Cache of individual math expressions
+            converted to MathML.
+        strict_highlight (bool): Never guess the language of unlabeled code
+            blocks; render them as plain text instead.
+    """
+
+    cache: Optional[RenderCache] = None
+    highlight_cache: Optional[RenderCache] = None
+    math_cache: Optional[RenderCache] = None
+    strict_highlight: bool = False
+
+
+MARKDOWN_EXTENSIONS = [
+    'fenced_code',
+    'codehilite',
+    'tables',
+    'extra',
+    'admonition',
+    'toc',
+    'pymdownx.tilde',
+]
+
+MARKDOWN_EXTENSION_CONFIGS = {
+    'codehilite': {
+        'guess_lang': True,
+        'use_pygments': True,
+        'css_class': 'codehilite',
+    }
+}
+
+# Distributions whose version can change the HTML a post renders to.
+RENDER_DISTRIBUTIONS = [
+    "markdown",
+    "pygments",
+    "latex2mathml",
+    "pymdown-extensions",
+]
+
+
+def extension_configs(options: RenderOptions) -> dict:
+    configs = copy.deepcopy(MARKDOWN_EXTENSION_CONFIGS)
+    if options.strict_highlight:
+        configs['codehilite']['guess_lang'] = False
+    return configs
+
+
+@lru_cache(maxsize=None)
+def render_config_digest(strict_highlight: bool = False) -> str:
+    """Hash the markdown configuration, the versions of the renderers and our own extensions."""
+    versions = {}
+    for dist in RENDER_DISTRIBUTIONS:
+        try:
+            versions[dist] = metadata.version(dist)
+        except metadata.PackageNotFoundError:
+            versions[dist] = None
+    config = {
+        "extensions": MARKDOWN_EXTENSIONS,
+        "extension_configs": extension_configs(
+            RenderOptions(strict_highlight=strict_highlight)
+        ),
+        "versions": versions,
+        "math": [tex.TEX_VERSION, tex.MACROS],
+        "sources": source_digest(__file__, highlight.__file__, tex.__file__),
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+def render_key(text: str, options: RenderOptions = RenderOptions()) -> str:
+    return hashlib.sha256(
+        render_config_digest(options.strict_highlight).encode()
+        + b"\0"
+        + text.encode("utf-8")
+    ).hexdigest()
+
+
+# One converter per process and set of options. Worker processes build their
+# own the first time they parse a post, so nothing is shared between them.
+_markdowners: Dict[RenderOptions, markdown.Markdown] = {}
+
+
+def get_markdowner(options: RenderOptions = RenderOptions()) -> markdown.Markdown:
+    md = _markdowners.get(options)
+    if md is None:
+        md = markdown.Markdown(
+            output_format="html",
+            extensions=[
+                *MARKDOWN_EXTENSIONS,
+                highlight.HighlightExtension(cache=options.highlight_cache),
+                tex.MathExtension(cache=options.math_cache),
+            ],
+            extension_configs=extension_configs(options),
+        )
+        _markdowners[options] = md
+    return md
+
+
+def render_markdown(text: str, options: RenderOptions = RenderOptions()) -> str:
+    """Convert a post body to HTML with a freshly reset converter.
+
+    ``reset()`` clears per-document state kept by extensions (``toc``,
+    footnotes, abbreviations) so one post can't leak into the next.
+    """
+    md = get_markdowner(options)
+    md.reset()
+    return md.convert(text)
+
+
+def parse_post(
+    post_path: Path,
+    options: RenderOptions = RenderOptions(),
+    timing: Optional[Dict[str, float]] = None,
+) -> Post:
+    """Parse a post's frontmatter and convert its body to HTML.
+
+    Args:
+        post_path (Path): Path to the markdown source.
+        options (RenderOptions): Caches and highlighting options. With
+            ``options.cache`` set, HTML previously rendered from the same body
+            with the same markdown configuration is reused.
+        timing (dict): If given, the seconds spent on ``"frontmatter"`` and
+            ``"markdown"`` are stored in it.
+    """
+    start = time.perf_counter()
+    post = frontmatter.load(str(post_path))
+    parsed = time.perf_counter()
+    highlight.current_source = post_path.name
+    if options.cache is None:
+        content = render_markdown(post.content, options)
+    else:
+        key = render_key(post.content, options)
+        content = options.cache.get(key)
+        if content is None:
+            content = render_markdown(post.content, options)
+            options.cache.put(key, content)
+    if timing is not None:
+        timing["frontmatter"] = parsed - start
+        timing["markdown"] = time.perf_counter() - parsed
+
+    return Post(
+        title=post.metadata.get("title", "Untitled"),  # type: ignore
+        date=post.metadata.get("date", datetime.now().date()),  # type: ignore
+        excerpt=post.metadata.get("excerpt", ""),  # type: ignore
+        url=f"/posts/{post_path.stem}/",
+        content=content,
+        tags=post.metadata.get("tags", []),  # type: ignore
+    )
+
+
+def _parse_with_stats(
+    post_path: Path, options: RenderOptions
+) -> Tuple[Post, highlight.HighlightStats, Dict[str, float]]:
+    timing: Dict[str, float] = {}
+    post = parse_post(post_path, options, timing)
+    return post, highlight.take_stats(), timing
+
+
+def load_posts(
+    posts_dir="src/posts",
+    jobs: int = 1,
+    options: RenderOptions = RenderOptions(),
+    stats: Optional[highlight.HighlightStats] = None,
+    timings: Optional[Dict[str, Dict[str, float]]] = None,
+) -> List[Post]:
+    """Parse every post under ``posts_dir``, newest first.
+
+    Args:
+        posts_dir (str): Directory containing the ``*.md`` posts.
+        jobs (int): Number of worker processes. With 1, posts are parsed in
+            this process.
+        options (RenderOptions): Caches and highlighting options.
+        stats (HighlightStats): If given, highlighting stats from every
+            process are merged into it.
+        timings (dict): If given, filled with the ``parse_post`` timing of
+            each post, by path.
+
+    Returns:
+        list: The parsed posts. Paths are visited in sorted order and the
+        sort by date is stable, so the result doesn't depend on ``jobs``.
+    """
+    paths = sorted(Path(posts_dir).glob("*.md"))
+    parse = partial(_parse_with_stats, options=options)
+    if jobs > 1 and len(paths) > 1:
+        chunksize = max(1, len(paths) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(parse, paths, chunksize=chunksize))
+    else:
+        results = [parse(path) for path in paths]
+
+    posts = []
+    for path, (post, post_stats, timing) in zip(paths, results):
+        posts.append(post)
+        if stats is not None:
+            stats.merge(post_stats)
+        if timings is not None:
+            timings[path.as_posix()] = timing
+    for cache in (options.cache, options.highlight_cache, options.math_cache):
+        if cache is not None:
+            cache.evict()
+    return sorted(posts, key=lambda x: x.date, reverse=True)
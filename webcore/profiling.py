@@ -0,0 +1,131 @@
+"""Per-stage and per-file timings of a build, for ``build.py --profile``."""
+
+import json
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+@dataclass
+class StageTiming:
+    seconds: float = 0.0
+    files: int = 0
+    bytes: int = 0
+    # Time spent in parts of the stage, summed over every worker process.
+    parts: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class FileTiming:
+    stage: str
+    name: str
+    seconds: float
+    bytes: int = 0
+
+
+class BuildProfile:
+    """Collects where a build spends its time.
+
+    Stages are timed as a whole and credited with the outputs the manifest
+    recorded while they ran. Posts, templates and listing pages are also
+    timed one by one. A disabled profile records nothing, so the build can
+    use one unconditionally.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.stages: Dict[str, StageTiming] = {}
+        self.files: List[FileTiming] = []
+        self.seconds = 0.0
+
+    @contextmanager
+    def stage(self, name: str, manifest=None, outpath: Optional[Path] = None):
+        if not self.enabled:
+            yield
+            return
+        written = len(manifest.written) if manifest is not None else 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timing = self.stages.setdefault(name, StageTiming())
+            timing.seconds += time.perf_counter() - start
+            if manifest is not None and outpath is not None:
+                for output in manifest.written[written:]:
+                    timing.files += 1
+                    timing.bytes += _size(Path(outpath) / output)
+
+    @contextmanager
+    def file(self, stage: str, name: str, output: Optional[Path] = None):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            size = _size(output) if output is not None else 0
+            self.files.append(FileTiming(stage, name, seconds, size))
+
+    def add_file(self, stage: str, name: str, seconds: float, size: int = 0) -> None:
+        if self.enabled:
+            self.files.append(FileTiming(stage, name, seconds, size))
+
+    def add_part(self, stage: str, part: str, seconds: float) -> None:
+        if self.enabled:
+            parts = self.stages.setdefault(stage, StageTiming()).parts
+            parts[part] = parts.get(part, 0.0) + seconds
+
+    def slowest(self, limit: int = 10) -> List[FileTiming]:
+        return sorted(self.files, key=lambda f: f.seconds, reverse=True)[:limit]
+
+    def report(self, limit: int = 10) -> str:
+        lines = [
+            f"Build profile ({self.seconds:.3f}s total)",
+            f"  {'stage':<16} {'seconds':>8} {'files':>6} {'written':>10}",
+        ]
+        for name, timing in self.stages.items():
+            lines.append(
+                f"  {name:<16} {timing.seconds:>8.3f} {timing.files:>6} "
+                f"{_format_bytes(timing.bytes):>10}"
+            )
+            for part, seconds in timing.parts.items():
+                lines.append(f"    {part:<14} {seconds:>8.3f}")
+        if self.files:
+            lines.append(f"Slowest {min(limit, len(self.files))} files:")
+            for f in self.slowest(limit):
+                size = _format_bytes(f.bytes) if f.bytes else ""
+                lines.append(f"  {f.seconds:>8.3f}s  {f.stage:<10} {f.name}  {size}")
+        return "\n".join(lines)
+
+    def to_dict(self, **extra) -> dict:
+        return dict(
+            extra,
+            seconds=self.seconds,
+            stages={name: asdict(timing) for name, timing in self.stages.items()},
+            files=[asdict(f) for f in self.files],
+        )
+
+    def dump(self, path: Path, **extra) -> None:
+        """Write the profile as JSON, with ``extra`` added at the top level."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(**extra), f, indent=2)
+            f.write("\n")
+
+
+def _size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+def _format_bytes(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KiB"
+    return f"{size / 1024 / 1024:.1f} MiB"
@@ -0,0 +1,105 @@
+import errno
+import os
+import shutil
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Iterable
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ioctl(2) request that makes a file share another's extents (Linux: btrfs,
+# XFS, bcachefs, ...). The copy is copy-on-write, so it's as cheap as a hard
+# link without tying the output to the source file.
+FICLONE = 0x40049409
+
+PUBLISH_MODES = ("auto", "reflink", "hardlink", "copy")
+
+# errnos meaning "this filesystem or pair of paths can't do that".
+UNSUPPORTED = {
+    errno.EXDEV,
+    errno.EPERM,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.EINVAL,
+    errno.ENOTTY,
+    errno.EMLINK,
+}
+
+# (method, st_dev) pairs that already failed, so a filesystem without
+# reflinks isn't asked again for every file.
+_unsupported = set()
+
+
+def reflink(src: Path, dst: Path) -> None:
+    if fcntl is None or not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "reflinks aren't supported here", str(dst))
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def publish_file(src: Path, dst: Path, mode: str = "auto") -> str:
+    """Put ``src`` at ``dst`` as cheaply as the filesystem allows.
+
+    ``dst`` is always unlinked first. Otherwise writing into an output that
+    is hard-linked to its source would change the source too.
+
+    Args:
+        src (Path): The source file.
+        dst (Path): Where to publish it; parent directories are created.
+        mode (str): ``"reflink"`` or ``"hardlink"`` to try only that before
+            copying, ``"auto"`` to try a reflink and then a hard link, or
+            ``"copy"`` to always copy.
+
+    Returns:
+        str: How the file was published: ``"reflink"``, ``"hardlink"`` or
+        ``"copy"``.
+    """
+    os.makedirs(dst.parent, exist_ok=True)
+    try:
+        os.unlink(dst)
+    except FileNotFoundError:
+        pass
+
+    attempts = {
+        "auto": [("reflink", reflink), ("hardlink", os.link)],
+        "reflink": [("reflink", reflink)],
+        "hardlink": [("hardlink", os.link)],
+        "copy": [],
+    }[mode]
+    device = os.stat(dst.parent).st_dev
+    for method, func in attempts:
+        if (method, device) in _unsupported:
+            continue
+        try:
+            func(src, dst)
+            return method
+        except OSError as e:
+            if e.errno not in UNSUPPORTED:
+                raise
+            _unsupported.add((method, device))
+    shutil.copy2(src, dst)
+    return "copy"
+
+
+def publish_files(
+    searchpath: Path, outpath: Path, names: Iterable[str], mode: str = "auto"
+) -> Counter:
+    """Publish ``names`` from ``searchpath`` into ``outpath``.
+
+    Returns:
+        Counter: Number of files published by each method.
+    """
+    methods = Counter()
+    for name in names:
+        methods[publish_file(Path(searchpath) / name, Path(outpath) / name, mode)] += 1
+    return methods
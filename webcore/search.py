@@ -0,0 +1,199 @@
+"""Prebuilt full-text search index for the posts.
+
+The index is written to ``build/search/`` and queried by
+``static/js/search.js``, which mirrors :func:`tokenize`, :func:`stem` and
+:func:`shard_of` exactly:
+
+- ``meta.json`` names the other files and holds the corpus statistics.
+- ``docs.<hash>.json`` lists ``[url, title, date, excerpt]`` per post.
+- ``shard-<n>.<hash>.json`` maps each term that hashes to shard ``n`` to
+  its postings.
+
+A term's postings are one flat list of integers: for every (post, field)
+the term occurs in, ``post delta, field, count, position deltas...``. Posts
+are numbered in listing order and fields are :data:`FIELDS`. A query only
+fetches the shards its terms hash to, so the shard count is picked to keep
+shards around :data:`TARGET_SHARD_BYTES`. Because terms are spread by hash,
+prefix search isn't supported.
+"""
+
+import hashlib
+import html
+import json
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+INDEX_VERSION = 1
+INDEX_DIR = "search"
+
+FIELDS = ["title", "tags", "body"]
+FIELD_WEIGHTS = [5.0, 3.0, 1.0]
+
+TARGET_SHARD_BYTES = 64 * 1024
+MAX_SHARDS = 4096
+EXCERPT_LENGTH = 160
+
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its of on or "
+    "so that the this to was we were will with".split()
+)
+
+TOKEN = re.compile(r"\w+")
+TAG = re.compile(r"<[^>]+>")
+
+# (suffix, replacement), tried in order; the first that leaves a stem of at
+# least three characters wins.
+SUFFIXES = [
+    ("ational", "ate"),
+    ("ization", "ize"),
+    ("ingly", ""),
+    ("edly", ""),
+    ("ment", ""),
+    ("ness", ""),
+    ("ing", ""),
+    ("ed", ""),
+    ("ly", ""),
+]
+
+
+def stem(word: str) -> str:
+    """Strip common English suffixes, so "patched" and "patches" meet at "patch"."""
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    if word.endswith("ies"):
+        word = word[:-3] + "y"
+    elif word.endswith("sses"):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    for suffix, replacement in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[: -len(suffix)] + replacement
+            break
+    if len(word) > 3 and word.endswith("e"):
+        word = word[:-1]
+    if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz":
+        word = word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into stemmed terms, dropping stop words."""
+    return [stem(t) for t in TOKEN.findall(text.lower()) if t not in STOP_WORDS]
+
+
+def html_text(content: str) -> str:
+    return html.unescape(TAG.sub(" ", content))
+
+
+def shard_of(term: str, shards: int) -> int:
+    """FNV-1a hash of the term's UTF-8 bytes, modulo the shard count."""
+    h = 0x811C9DC5
+    for byte in term.encode("utf-8"):
+        h = ((h ^ byte) * 0x01000193) & 0xFFFFFFFF
+    return h % shards
+
+
+def build_postings(posts: Iterable) -> Tuple[List[list], Dict[str, List[int]]]:
+    """Tokenize every post and collect the postings of every term.
+
+    Returns:
+        tuple: The document table and the postings per term.
+    """
+    docs = []
+    postings: Dict[str, List[int]] = defaultdict(list)
+    last_doc: Dict[str, int] = {}
+    for doc, post in enumerate(posts):
+        excerpt = post.excerpt or html_text(post.content).strip()
+        docs.append(
+            [post.url, post.title, str(post.date), " ".join(excerpt.split())[:EXCERPT_LENGTH]]
+        )
+        fields = [post.title, " ".join(post.tags), html_text(post.content)]
+        for field, text in enumerate(fields):
+            positions: Dict[str, List[int]] = defaultdict(list)
+            for position, term in enumerate(tokenize(text)):
+                positions[term].append(position)
+            for term, found in positions.items():
+                entry = postings[term]
+                entry.append(doc - last_doc.get(term, 0))
+                last_doc[term] = doc
+                entry.append(field)
+                entry.append(len(found))
+                previous = 0
+                for position in found:
+                    entry.append(position - previous)
+                    previous = position
+    return docs, postings
+
+
+def shard_count(postings: Dict[str, List[int]]) -> int:
+    # Roughly what the postings take up as JSON.
+    size = sum(len(term) + 4 + 3 * len(entry) for term, entry in postings.items())
+    shards = 1
+    while shards < MAX_SHARDS and size / shards > TARGET_SHARD_BYTES:
+        shards *= 2
+    return shards
+
+
+def dump(value) -> bytes:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def build_index(posts: Iterable) -> Dict[str, bytes]:
+    """Build the index files for ``posts``.
+
+    Returns:
+        dict: File contents by name, relative to the index directory.
+    """
+    docs, postings = build_postings(posts)
+    shards = shard_count(postings)
+    grouped: List[Dict[str, List[int]]] = [{} for _ in range(shards)]
+    for term in sorted(postings):
+        grouped[shard_of(term, shards)][term] = postings[term]
+
+    files = {}
+
+    def add(prefix, data):
+        name = f"{prefix}.{hashlib.sha256(data).hexdigest()[:10]}.json"
+        files[name] = data
+        return name
+
+    meta = {
+        "version": INDEX_VERSION,
+        "count": len(docs),
+        "fields": FIELDS,
+        "weights": FIELD_WEIGHTS,
+        "stopWords": sorted(STOP_WORDS),
+        "docs": add("docs", dump(docs)),
+        "shards": [add(f"shard-{n}", dump(shard)) for n, shard in enumerate(grouped)],
+    }
+    files["meta.json"] = dump(meta)
+    return files
+
+
+def write_index(outpath: Path, posts: Iterable, manifest=None) -> List[str]:
+    """Write the index for ``posts`` under ``outpath / INDEX_DIR``.
+
+    Files whose content didn't change aren't rewritten. Every file name but
+    ``meta.json`` contains a hash of the file, so clients may cache them
+    forever.
+
+    Returns:
+        list: The files written, relative to ``outpath``.
+    """
+    written = []
+    for name, data in build_index(posts).items():
+        output = f"{INDEX_DIR}/{name}"
+        key = hashlib.sha256(data).hexdigest()
+        if manifest is not None:
+            if manifest.is_fresh(outpath, output, key):
+                continue
+            manifest.record(output, key)
+        target = Path(outpath) / output
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        written.append(output)
+    return written
+
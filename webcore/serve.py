@@ -0,0 +1,447 @@
+import email.utils
+import gzip
+import http.server
+import io
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import partial
+from http import HTTPStatus
+from pathlib import Path
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from webcore.assets import FINGERPRINTED
+from webcore.compress import brotli, is_compressible
+
+
+class RebuildHandler(FileSystemEventHandler):
+    """Collect filesystem events and rebuild once they stop arriving.
+
+    Editors emit several events per save (truncate, write, swap file renames),
+    so changed paths are gathered until ``delay`` seconds pass without a new
+    event and then handed to ``build_func`` in a single call.
+    """
+
+    # Emitted when a file is merely read, including by the build itself.
+    IGNORED_EVENTS = {"opened", "closed_no_write"}
+
+    def __init__(self, build_func, delay=0.2, on_rebuild=None):
+        self.build_func = build_func
+        self.delay = delay
+        self.on_rebuild = on_rebuild
+        self.pending = set()
+        self.timer = None
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type in self.IGNORED_EVENTS:
+            return
+        paths = {os.fsdecode(event.src_path)}
+        if getattr(event, "dest_path", ""):
+            paths.add(os.fsdecode(event.dest_path))
+
+        with self.lock:
+            self.pending |= paths
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            changed, self.pending = sorted(self.pending), set()
+            self.timer = None
+        if not changed:
+            return
+
+        with self.build_lock:
+            print(f"Change detected: {', '.join(changed)}. Rebuilding...")
+
+            try:
+                result = self.build_func(changed=changed)
+            except Exception:
+                traceback.print_exc()
+                return
+
+            print(
+                f"Rebuilt in {result.seconds * 1000:.0f} ms: "
+                f"{len(result.written)} written, {len(result.removed)} removed"
+            )
+            for name in result.written + result.removed:
+                print(f"  {name}")
+            if self.on_rebuild is not None:
+                self.on_rebuild(result)
+
+
+LIVERELOAD_PATH = "/__livereload"
+LIVERELOAD_SCRIPT = "/__livereload.js"
+LIVERELOAD_CLIENT = Path(__file__).with_name("livereload.js")
+
+
+class LiveReload:
+    """Fans rebuild notifications out to every connected browser."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+
+    @contextmanager
+    def subscribe(self):
+        events = queue.Queue()
+        with self.lock:
+            self.subscribers.add(events)
+        try:
+            yield events
+        finally:
+            with self.lock:
+                self.subscribers.discard(events)
+
+    def publish(self, changed):
+        """Tell every browser which output paths a rebuild wrote or removed."""
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for events in subscribers:
+            events.put(list(changed))
+
+
+def inject_livereload(html: bytes) -> bytes:
+    tag = f'<script src="{LIVERELOAD_SCRIPT}" defer></script>'.encode()
+    index = html.rfind(b"</body>")
+    if index == -1:
+        return html + tag
+    return html[:index] + tag + html[index:]
+
+
+class DevRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Static file handler for the development server.
+
+    Speaks HTTP/1.1 so browsers reuse connections, answers conditional
+    requests from an ETag/Last-Modified pair, serves single byte ranges and
+    can compress text responses on the fly when the server has ``compress``
+    set.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; don't let Nagle hold the
+    # body back waiting for the client's delayed ACK.
+    disable_nagle_algorithm = True
+    min_compress_size = 1024
+
+    def log_message(self, format, *args):
+        if not getattr(self.server, "quiet", False):
+            super().log_message(format, *args)
+
+    def end_headers(self):
+        if FINGERPRINTED.search(self.path.split("?", 1)[0]):
+            self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        else:
+            self.send_header("Cache-Control", "no-cache")
+        super().end_headers()
+
+    def do_GET(self):
+        if self.server.livereload is not None:
+            route = self.path.split("?", 1)[0]
+            if route == LIVERELOAD_PATH:
+                return self.stream_livereload()
+            if route == LIVERELOAD_SCRIPT:
+                return self.send_livereload_script()
+        return super().do_GET()
+
+    def send_livereload_script(self):
+        body = LIVERELOAD_CLIENT.read_bytes()
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/javascript")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_livereload(self):
+        """Hold the connection open and push a server-sent event per rebuild."""
+        self.close_connection = True
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        with self.server.livereload.subscribe() as events:
+            try:
+                self.wfile.write(b"retry: 500\n\n")
+                self.wfile.flush()
+                while True:
+                    try:
+                        changed = events.get(timeout=15)
+                    except queue.Empty:
+                        self.wfile.write(b": ping\n\n")
+                    else:
+                        payload = json.dumps({"changed": changed})
+                        self.wfile.write(f"event: rebuild\ndata: {payload}\n\n".encode())
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError, OSError):
+                pass
+
+    def send_head(self):
+        self.byte_range = None
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            index = os.path.join(path, "index.html")
+            if not self.path.split("?", 1)[0].endswith("/") or not os.path.isfile(index):
+                return super().send_head()
+            path = index
+        if path.endswith("/"):
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
+        try:
+            st = os.fstat(f.fileno())
+            ctype = self.guess_type(path)
+            etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+            encoding = self.choose_encoding(ctype, st.st_size)
+            if encoding:
+                etag = f'{etag[:-1]}-{encoding}"'
+
+            if self.not_modified(etag, st.st_mtime):
+                f.close()
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return None
+
+            inject = self.server.livereload is not None and ctype == "text/html"
+            if encoding or inject:
+                def load():
+                    data = f.read()
+                    return inject_livereload(data) if inject else data
+
+                if encoding:
+                    body = self.server.compressed(path, etag, encoding, load)
+                else:
+                    body = load()
+                f.close()
+                self.send_response(HTTPStatus.OK)
+                self.send_header("Content-Type", ctype)
+                if encoding:
+                    self.send_header("Content-Encoding", encoding)
+                    self.send_header("Vary", "Accept-Encoding")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_validators(etag, st.st_mtime)
+                self.end_headers()
+                return io.BytesIO(body)
+
+            byte_range = self.parse_range(st.st_size, etag, st.st_mtime)
+            if byte_range == "unsatisfiable":
+                f.close()
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{st.st_size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+            if byte_range is not None:
+                start, end = byte_range
+                f.seek(start)
+                self.byte_range = end - start + 1
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{st.st_size}")
+                length = self.byte_range
+            else:
+                self.send_response(HTTPStatus.OK)
+                length = st.st_size
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(length))
+            self.send_header("Accept-Ranges", "bytes")
+            if self.server.compress and is_compressible(ctype):
+                self.send_header("Vary", "Accept-Encoding")
+            self.send_validators(etag, st.st_mtime)
+            self.end_headers()
+            return f
+        except:
+            f.close()
+            raise
+
+    def send_validators(self, etag, mtime):
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.date_time_string(int(mtime)))
+
+    def not_modified(self, etag, mtime):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return etag in tags or "*" in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, IndexError, OverflowError, ValueError):
+                return False
+            return int(mtime) <= since.timestamp()
+        return False
+
+    def parse_range(self, size, etag, mtime):
+        """Parse a single ``bytes=`` range.
+
+        Returns:
+            tuple: Inclusive ``(start, end)`` offsets, None to send the whole
+            file, or ``"unsatisfiable"``.
+        """
+        header = self.headers.get("Range")
+        if not header or not header.startswith("bytes=") or "," in header:
+            return None
+        if_range = self.headers.get("If-Range")
+        if if_range is not None and if_range != etag:
+            if if_range != self.date_time_string(int(mtime)):
+                return None
+        first, _, last = header[len("bytes="):].strip().partition("-")
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else size - 1
+            else:
+                start = max(0, size - int(last))
+                end = size - 1
+        except ValueError:
+            return None
+        end = min(end, size - 1)
+        if start > end:
+            return "unsatisfiable"
+        return start, end
+
+    def choose_encoding(self, ctype, size):
+        if not self.server.compress or size < self.min_compress_size:
+            return None
+        if "Range" in self.headers or not is_compressible(ctype):
+            return None
+        accepted = {
+            part.split(";", 1)[0].strip()
+            for part in self.headers.get("Accept-Encoding", "").split(",")
+        }
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def copyfile(self, source, outputfile):
+        if self.byte_range is None:
+            return super().copyfile(source, outputfile)
+        remaining = self.byte_range
+        while remaining > 0:
+            chunk = source.read(min(64 * 1024, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+
+
+class DevServer(http.server.ThreadingHTTPServer):
+    """Threaded server that also caches compressed responses per ETag."""
+
+    daemon_threads = True
+
+    def __init__(self, address, handler, compress=False, quiet=False, livereload=None):
+        super().__init__(address, handler)
+        self.compress = compress
+        self.quiet = quiet
+        self.livereload = livereload
+        self._compressed = OrderedDict()
+        self._compressed_lock = threading.Lock()
+
+    def compressed(self, path, etag, encoding, load, max_entries=256):
+        key = (path, etag)
+        with self._compressed_lock:
+            body = self._compressed.get(key)
+            if body is not None:
+                self._compressed.move_to_end(key)
+                return body
+        data = load()
+        if encoding == "br":
+            body = brotli.compress(data, quality=5)
+        else:
+            body = gzip.compress(data, compresslevel=6, mtime=0)
+        with self._compressed_lock:
+            self._compressed[key] = body
+            while len(self._compressed) > max_entries:
+                self._compressed.popitem(last=False)
+        return body
+
+
+def make_server(directory="build", port=8000, compress=False, quiet=False, livereload=None):
+    handler = partial(DevRequestHandler, directory=os.path.abspath(directory))
+    return DevServer(
+        ("", port), handler, compress=compress, quiet=quiet, livereload=livereload
+    )
+
+
+def run_server(directory="build", port=8000, compress=False, livereload=None):
+    """Run the development HTTP server for the built site"""
+    with make_server(directory, port, compress=compress, livereload=livereload) as httpd:
+        print(f"Serving at http://localhost:{port}")
+        httpd.serve_forever()
+
+
+def watch_and_build(
+    build_func, rebuild_func, path="src", port=8000, compress=False, livereload=True
+):
+    """Build the site, serve it and rebuild whenever ``path`` changes.
+
+    Args:
+        build_func (callable): Runs the initial build.
+        rebuild_func (callable): Runs a rebuild; called with ``changed``, the
+            list of paths that changed since the last one.
+        compress (bool): Compress text responses on the fly.
+        livereload (bool): Inject a script into served pages that reloads
+            them, or swaps their stylesheets, when a rebuild touches them.
+    """
+    abs_path = os.path.abspath(path)
+    if not os.path.exists(abs_path):
+        os.makedirs(abs_path, exist_ok=True)
+        print(f"Created missing directory: {abs_path}")
+
+    build_func()
+
+    broker = LiveReload() if livereload else None
+    server_thread = threading.Thread(
+        target=run_server,
+        args=("build", port),
+        kwargs={"compress": compress, "livereload": broker},
+    )
+    server_thread.daemon = True
+    server_thread.start()
+
+    on_rebuild = None
+    if broker is not None:
+        on_rebuild = lambda result: broker.publish(result.written + result.removed)
+    event_handler = RebuildHandler(rebuild_func, on_rebuild=on_rebuild)
+    observer = Observer()
+    observer.schedule(event_handler, abs_path, recursive=True)
+
+    try:
+        observer.start()
+    except FileNotFoundError:
+        print(
+            f"Error: Could not watch directory {abs_path}. Please make sure it exists."
+        )
+        return
+
+    print(
+        f"Watching '{abs_path}' for changes. Site available at http://localhost:{port}"
+    )
+    print("Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        observer.stop()
+    observer.join()
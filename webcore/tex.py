@@ -0,0 +1,187 @@
+"""Build-time rendering of TeX math to MathML.
+
+:class:`MathExtension` takes the place of ``mdx_math``: it recognises the
+same delimiters, ``$...$``, ``\\(...\\)``, ``$$...$$``, ``\\[...\\]`` and
+``\\begin...\\end``, plus the macros in :data:`MACROS`, and converts each
+expression to MathML with ``latex2mathml``. Browsers render MathML
+natively, so pages whose math all converted need no script at all.
+
+Expressions that can't be converted, or every expression when
+``latex2mathml`` isn't installed, are left as ``<script type="math/tex">``
+for MathJax, exactly as ``mdx_math`` emits them; :func:`needs_runtime` tells
+the templates which pages still have to load it.
+
+Conversions are memoized per process and, given a cache, on disk.
+"""
+
+import hashlib
+import json
+import re
+from importlib import metadata
+from typing import Dict, Optional
+from xml.etree.ElementTree import Element
+
+from markdown import Extension
+from markdown.inlinepatterns import InlineProcessor
+from markdown.util import AtomicString
+
+from webcore.cache import RenderCache, source_digest
+
+try:
+    from latex2mathml.converter import convert as latex_to_mathml
+except ImportError:
+    latex_to_mathml = None
+
+# Bumped whenever the generated markup changes, so cached conversions are redone.
+TEX_VERSION = 1
+SOURCE_DIGEST = source_digest(__file__)
+
+# name: (argument count, replacement). The MathJax config in _mathjax.html
+# defines the same macros for the expressions left to the browser.
+MACROS = {
+    "ket": (1, r"\left|#1\right\rangle"),
+    "bra": (1, r"\left\langle#1\right|"),
+    "braket": (2, r"\left\langle#1|#2\right\rangle"),
+}
+
+RUNTIME_TYPE = "math/tex"
+RUNTIME_MARKER = f'<script type="{RUNTIME_TYPE}'
+
+MACRO = re.compile(
+    r"\\(%s)(?![A-Za-z])" % "|".join(sorted(MACROS, key=len, reverse=True))
+)
+# latex2mathml passes commands it doesn't know through as identifiers.
+UNKNOWN_COMMAND = re.compile(r">\\[A-Za-z]+<")
+
+# Per-process state; each worker process keeps its own.
+_memo: Dict[str, Optional[str]] = {}
+_disk: Optional[RenderCache] = None
+
+
+def converter_version() -> Optional[str]:
+    try:
+        return metadata.version("latex2mathml")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def needs_runtime(html: str) -> bool:
+    """Whether ``html`` has math left for MathJax to typeset."""
+    return RUNTIME_MARKER in html
+
+
+def _argument(tex: str, pos: int):
+    """Read one macro argument at ``pos``: a braced group or a single token."""
+    while pos < len(tex) and tex[pos].isspace():
+        pos += 1
+    if pos >= len(tex):
+        return "", pos
+    if tex[pos] != "{":
+        if tex[pos] == "\\":
+            command = re.match(r"\\([A-Za-z]+|.)", tex[pos:])
+            return command.group(0), pos + len(command.group(0))
+        return tex[pos], pos + 1
+    depth = 0
+    for end in range(pos, len(tex)):
+        if tex[end] == "{" and tex[end - 1] != "\\":
+            depth += 1
+        elif tex[end] == "}" and tex[end - 1] != "\\":
+            depth -= 1
+            if depth == 0:
+                return tex[pos + 1 : end], end + 1
+    return tex[pos + 1 :], len(tex)
+
+
+def expand_macros(tex: str) -> str:
+    """Replace every use of :data:`MACROS` with its definition."""
+    start = 0
+    while (m := MACRO.search(tex, start)) is not None:
+        count, body = MACROS[m.group(1)]
+        pos = m.end()
+        for n in range(1, count + 1):
+            arg, pos = _argument(tex, pos)
+            # Braced, so "\\langle#1" can't turn into a longer command name.
+            body = body.replace(f"#{n}", f"{{{arg}}}")
+        tex = tex[: m.start()] + body + tex[pos:]
+        # Arguments may use macros themselves, so look again from here.
+        start = m.start()
+    return tex
+
+
+def math_key(tex: str, display: bool) -> str:
+    payload = json.dumps([TEX_VERSION, SOURCE_DIGEST, converter_version(), MACROS, tex, display])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _convert(tex: str, display: bool) -> Optional[str]:
+    if latex_to_mathml is None:
+        return None
+    try:
+        html = latex_to_mathml(expand_macros(tex), display="block" if display else "inline")
+    except Exception:
+        # latex2mathml raises all sorts of errors on input it can't parse.
+        return None
+    if UNKNOWN_COMMAND.search(html):
+        return None
+    return html
+
+
+def render(tex: str, display: bool = False) -> Optional[str]:
+    """Convert one expression to MathML, or None if MathJax has to do it."""
+    key = math_key(tex, display)
+    if key in _memo:
+        return _memo[key]
+    if _disk is not None and (cached := _disk.get(key)) is not None:
+        html = _memo[key] = json.loads(cached)
+        return html
+    html = _memo[key] = _convert(tex, display)
+    if _disk is not None:
+        _disk.put(key, json.dumps(html))
+    return html
+
+
+class MathPattern(InlineProcessor):
+    def __init__(self, pattern, md, display: bool, tex_group: int = 2):
+        super().__init__(pattern, md)
+        self.display = display
+        self.tex_group = tex_group
+
+    def handleMatch(self, m, data):
+        tex = m.group(self.tex_group)
+        html = render(tex, self.display)
+        if html is not None:
+            return self.md.htmlStash.store(html), m.start(0), m.end(0)
+        node = Element("script")
+        node.set("type", f"{RUNTIME_TYPE}; mode=display" if self.display else RUNTIME_TYPE)
+        node.text = AtomicString(tex)
+        return node, m.start(0), m.end(0)
+
+
+class MathExtension(Extension):
+    """Render math at build time, falling back to MathJax's script tags.
+
+    Like :class:`webcore.highlight.HighlightExtension`, the cache is
+    process-wide; the last extension instance to be loaded wins.
+    """
+
+    def __init__(self, cache: Optional[RenderCache] = None, **kwargs):
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def extendMarkdown(self, md):
+        global _disk
+        _disk = self.cache
+        # The delimiters and priorities of mdx_math with enable_dollar_delimiter,
+        # matching the inline and display math MathJax was configured for.
+        patterns = [
+            (r"(?<!\\)(\$\$)([^\$]+)(\$\$)", True, 2, 185),
+            (r"(?<!\\)(\\\[)(.+?)(\\\])", True, 2, 185),
+            (r"(?<!\\)(\\begin{([a-z]+?\*?)})(.+?)(\\end{\2})", True, 0, 184),
+            (r"(?<!\\|\$)(\$)([^\$]+)(\$)", False, 2, 185),
+            (r"(?<!\\)(\\\()(.+?)(\\\))", False, 2, 185),
+        ]
+        for i, (pattern, display, group, priority) in enumerate(patterns):
+            md.inlinePatterns.register(
+                MathPattern(pattern, md, display, group), f"math-{i}", priority
+            )
+        md.ESCAPED_CHARS.append("$")